@@ -2,7 +2,7 @@ from django.contrib import admin
 from django.utils.html import mark_safe
 
 from travel.models import Role, User, Provider, Customer, ServiceType, Province, Image, Service, Discount, \
-    ServiceSchedule, Booking, Review
+    ServiceSchedule, Booking, Review, RevenueDaily, SeatHold, PaymentTransaction, UploadTask
 from django import forms
 
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
@@ -55,3 +55,7 @@ admin.site.register(Discount)
 admin.site.register(ServiceSchedule)
 admin.site.register(Booking)
 admin.site.register(Review)
+admin.site.register(RevenueDaily)
+admin.site.register(SeatHold)
+admin.site.register(PaymentTransaction)
+admin.site.register(UploadTask)
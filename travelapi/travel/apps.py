@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TravelConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'travel'
+
+    def ready(self):
+        from travel import signals  # noqa: F401
+        from travel.http import install_cloudinary_pool
+
+        install_cloudinary_pool()
@@ -0,0 +1,67 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from oauth2_provider.models import get_access_token_model
+from rest_framework import exceptions
+
+
+def get_token_cache():
+    return caches[getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')]
+
+
+def token_cache_key(token):
+    # Không dùng token gốc làm key để token không nằm nguyên văn trong cache
+    return f'oauth2-token:{hashlib.sha256(token.encode()).hexdigest()}'
+
+
+def invalidate_token(token):
+    get_token_cache().delete(token_cache_key(token))
+
+
+def invalidate_user_tokens(user_id):
+    tokens = get_access_token_model().objects.filter(user_id=user_id).values_list('token', flat=True)
+    get_token_cache().delete_many([token_cache_key(token) for token in tokens])
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """
+    OAuth2Authentication nhưng nhớ AccessToken (kèm user, application) đã hợp lệ trong cache
+    cho đến khi token hết hạn hoặc hết AUTH_TOKEN_CACHE_TIMEOUT, tuỳ cái nào đến trước.
+    Signal của AccessToken và User xoá entry ngay khi token bị thu hồi hoặc user thay đổi.
+    """
+
+    def authenticate(self, request):
+        token = self.get_bearer_token(request)
+        if not token:
+            return super().authenticate(request)
+
+        token_cache = get_token_cache()
+        key = token_cache_key(token)
+        access_token = token_cache.get(key)
+        if access_token is None or not access_token.is_valid():
+            result = super().authenticate(request)
+            if result is None:
+                return None
+
+            access_token = result[1]
+            ttl = min(getattr(settings, 'AUTH_TOKEN_CACHE_TIMEOUT', 60),
+                      int((access_token.expires - timezone.now()).total_seconds()))
+            if ttl > 0:
+                token_cache.set(key, access_token, ttl)
+
+        # OAuth2Authentication không kiểm tra is_active, user bị khoá vẫn dùng được token cũ
+        if access_token.user is not None and not access_token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        return access_token.user, access_token
+
+    @staticmethod
+    def get_bearer_token(request):
+        auth = request.META.get('HTTP_AUTHORIZATION', '').split()
+        if len(auth) == 2 and auth[0].lower() == 'bearer':
+            return auth[1]
+
+        return None
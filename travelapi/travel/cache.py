@@ -0,0 +1,103 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def get_response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+
+def _version_key(group, scope):
+    return f'resp-version:{group}:{scope}'
+
+
+def get_version(group, scope):
+    return get_response_cache().get(_version_key(group, scope), 0)
+
+
+def invalidate(group, *scopes):
+    # Tăng version thay vì xoá key: các key cũ không còn được đọc và tự hết hạn theo TTL
+    response_cache = get_response_cache()
+    for scope in scopes:
+        key = _version_key(group, scope)
+        try:
+            response_cache.incr(key)
+        except ValueError:
+            response_cache.set(key, 1, None)
+
+
+def calendar_scope(service_id, day):
+    # day có thể là date hoặc chuỗi ISO, đều bắt đầu bằng YYYY-MM
+    return f'{service_id}:{str(day)[:7]}'
+
+
+def invalidate_calendar(schedules):
+    # schedules: các cặp (service_id, date) có số chỗ vừa thay đổi
+    for scope in {calendar_scope(service_id, day) for service_id, day in schedules}:
+        invalidate('calendar', scope)
+
+
+def invalidate_dashboard(provider_ids):
+    invalidate('dashboard', *{provider_id for provider_id in provider_ids if provider_id is not None})
+
+
+def calendar_cache_key(service_id, month):
+    scope = calendar_scope(service_id, month)
+    return f'calendar:{scope}:{get_version("calendar", scope)}'
+
+
+def response_cache_key(request, group, scope):
+    params = sorted((key, sorted(values)) for key, values in request.query_params.lists())
+    query = urlencode([(key, value) for key, values in params for value in values])
+    digest = hashlib.md5(f'{request.get_host()}{request.path}?{query}'.encode()).hexdigest()
+    return f'resp:{group}:{scope}:{get_version(group, scope)}:{digest}'
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+
+    candidates = [tag.strip().removeprefix('W/') for tag in header.split(',')]
+    return '*' in candidates or etag in candidates
+
+
+class CachedResponseMixin:
+    """
+    Cache dữ liệu của list/retrieve theo path và query params đã chuẩn hoá.
+    Các signal gọi invalidate(cache_group, 'list' | pk) khi dữ liệu thay đổi.
+    """
+    cache_group = None
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response('list', super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        scope = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.cached_response(scope, super().retrieve, request, *args, **kwargs)
+
+    def cached_response(self, scope, handler, request, *args, **kwargs):
+        response_cache = get_response_cache()
+        key = response_cache_key(request, self.cache_group, scope)
+
+        cached = response_cache.get(key)
+        if cached is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+
+            # ETag tính trên bản JSON đã render nên đổi khi và chỉ khi nội dung đổi
+            content = self.get_renderers()[0].render(response.data)
+            etag = f'"{hashlib.md5(content).hexdigest()}"'
+            cached = (response.data, etag)
+            response_cache.set(key, cached, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+        data, etag = cached
+        if etag_matches(request, etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+        return Response(data, headers={'ETag': etag})
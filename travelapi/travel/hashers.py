@@ -0,0 +1,80 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, ScryptPasswordHasher, Argon2PasswordHasher
+
+
+# Giữ nguyên tên algorithm của Django nên hash cũ vẫn kiểm tra được; đổi chi phí thì
+# hash cũ bị coi là cần cập nhật và được băm lại ở lần đăng nhập kế tiếp
+class TunedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
+
+
+class TunedScryptPasswordHasher(ScryptPasswordHasher):
+    work_factor = getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', ScryptPasswordHasher.work_factor)
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    # Cần cài argon2-cffi
+    time_cost = getattr(settings, 'PASSWORD_ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = getattr(settings, 'PASSWORD_ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = getattr(settings, 'PASSWORD_ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+_executor = None
+
+
+def get_executor():
+    # Số luồng băm mật khẩu có giới hạn để một đợt đăng ký không chiếm hết CPU của worker;
+    # hashlib và argon2-cffi nhả GIL khi băm nên các luồng chạy song song được
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'PASSWORD_HASHING_WORKERS', 4),
+                                       thread_name_prefix='hasher')
+    return _executor
+
+
+def needs_rehash(encoded):
+    # Cùng điều kiện với django.contrib.auth.hashers.check_password
+    preferred = hashers.get_hasher('default')
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+
+    return hasher.algorithm != preferred.algorithm or preferred.must_update(encoded)
+
+
+def make_password(password):
+    return get_executor().submit(hashers.make_password, password).result()
+
+
+def verify_password(user, raw_password, rehash=True):
+    """Như user.check_password() nhưng phần băm chạy trong pool; việc lưu hash mới vẫn ở luồng hiện tại."""
+    encoded = user.password
+    if not get_executor().submit(hashers.check_password, raw_password, encoded).result():
+        return False
+
+    if rehash and needs_rehash(encoded):
+        user.password = make_password(raw_password)
+        user.save(update_fields=['password'])
+
+    return True
+
+
+async def amake_password(password):
+    return await asyncio.wrap_future(get_executor().submit(hashers.make_password, password))
+
+
+async def averify_password(user, raw_password, rehash=True):
+    encoded = user.password
+    if not await asyncio.wrap_future(get_executor().submit(hashers.check_password, raw_password, encoded)):
+        return False
+
+    if rehash and needs_rehash(encoded):
+        user.password = await amake_password(raw_password)
+        await user.asave(update_fields=['password'])
+
+    return True
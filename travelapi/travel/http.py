@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import weakref
+from collections import defaultdict
+from urllib.parse import urlsplit
+
+import cloudinary
+import httpx
+import urllib3
+from cloudinary.api_client.tcp_keep_alive_manager import TCPKeepAlivePoolManager, \
+    TCPKeepAliveHTTPConnectionPool, TCPKeepAliveHTTPSConnectionPool
+from django.conf import settings
+
+# Đếm số request và số kết nối TCP mới theo host để kiểm tra mức tái sử dụng kết nối
+_stats = defaultdict(lambda: {'requests': 0, 'connections': 0})
+_stats_lock = threading.Lock()
+
+
+def record(host, key):
+    with _stats_lock:
+        _stats[host][key] += 1
+
+
+def get_stats():
+    with _stats_lock:
+        return {host: dict(values, reused=values['requests'] - values['connections'])
+                for host, values in _stats.items()}
+
+
+def host_timeout(host):
+    return getattr(settings, 'HTTP_HOST_TIMEOUTS', {}).get(host, getattr(settings, 'HTTP_DEFAULT_TIMEOUT', 10))
+
+
+class CountingPoolMixin:
+    def _new_conn(self):
+        record(self.host, 'connections')
+        return super()._new_conn()
+
+    def urlopen(self, method, url, *args, **kwargs):
+        record(self.host, 'requests')
+        return super().urlopen(method, url, *args, **kwargs)
+
+
+class CountingHTTPConnectionPool(CountingPoolMixin, TCPKeepAliveHTTPConnectionPool):
+    pass
+
+
+class CountingHTTPSConnectionPool(CountingPoolMixin, TCPKeepAliveHTTPSConnectionPool):
+    pass
+
+
+class SharedPoolManager(TCPKeepAlivePoolManager):
+    """PoolManager dùng chung toàn process: giữ kết nối keep-alive, timeout riêng cho từng host."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.pool_classes_by_scheme = {'http': CountingHTTPConnectionPool, 'https': CountingHTTPSConnectionPool}
+
+    def _new_pool(self, scheme, host, port, request_context=None):
+        request_context = (request_context or self.connection_pool_kw).copy()
+        request_context['timeout'] = urllib3.Timeout(connect=getattr(settings, 'HTTP_CONNECT_TIMEOUT', 3),
+                                                     read=host_timeout(host))
+        return super()._new_pool(scheme, host, port, request_context)
+
+
+_pool_manager = None
+_pool_manager_lock = threading.Lock()
+
+
+def get_pool_manager():
+    global _pool_manager
+    with _pool_manager_lock:
+        if _pool_manager is None:
+            _pool_manager = SharedPoolManager(num_pools=getattr(settings, 'HTTP_NUM_POOLS', 10),
+                                              maxsize=getattr(settings, 'HTTP_POOL_MAXSIZE', 10),
+                                              block=False,
+                                              **cloudinary.CERT_KWARGS)
+    return _pool_manager
+
+
+def install_cloudinary_pool():
+    # Cloudinary mặc định giữ 1 kết nối mỗi host, upload song song sẽ mở rồi bỏ kết nối liên tục
+    from cloudinary import uploader
+    from cloudinary.api_client import call_api
+
+    if cloudinary.config().api_proxy:
+        return
+
+    uploader._http = get_pool_manager()
+    call_api._http = get_pool_manager()
+
+
+async def _count_request(request):
+    host = request.url.host
+    record(host, 'requests')
+
+    async def trace(event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            record(host, 'connections')
+
+    request.extensions['trace'] = trace
+
+
+# Mỗi event loop dùng chung một AsyncClient. Dưới ASGI loop sống suốt process nên kết nối keep-alive được
+# dùng lại giữa các request; dưới WSGI mỗi view async chạy trong loop riêng nên phải aclose_async_client()
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            timeout=httpx.Timeout(getattr(settings, 'HTTP_DEFAULT_TIMEOUT', 10),
+                                  connect=getattr(settings, 'HTTP_CONNECT_TIMEOUT', 3)),
+            limits=httpx.Limits(max_connections=getattr(settings, 'PAYMENT_HTTP_MAX_CONNECTIONS', 20),
+                                max_keepalive_connections=getattr(settings, 'PAYMENT_HTTP_MAX_KEEPALIVE', 10)),
+            event_hooks={'request': [_count_request]},
+        )
+        _async_clients[loop] = client
+
+    return client
+
+
+async def aclose_async_client():
+    client = _async_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def apost(url, **kwargs):
+    """POST tới cổng thanh toán, thử lại khi lỗi kết nối/timeout với thời gian chờ tăng dần."""
+    retries = getattr(settings, 'PAYMENT_HTTP_RETRIES', 2)
+    backoff = getattr(settings, 'PAYMENT_HTTP_RETRY_BACKOFF', 0.2)
+    client = get_async_client()
+    timeout = httpx.Timeout(host_timeout(urlsplit(url).hostname),
+                            connect=getattr(settings, 'HTTP_CONNECT_TIMEOUT', 3))
+
+    for attempt in range(retries + 1):
+        try:
+            return await client.post(url, timeout=timeout, **kwargs)
+        except httpx.TransportError:
+            if attempt == retries:
+                raise
+            await asyncio.sleep(backoff * 2 ** attempt)
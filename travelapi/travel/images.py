@@ -0,0 +1,65 @@
+from cloudinary import CloudinaryResource
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+
+DEFAULT_VARIANT = 'full'
+
+
+def get_variants():
+    return getattr(settings, 'IMAGE_VARIANTS', {DEFAULT_VARIANT: {}})
+
+
+def build_variants(resource):
+    # Dựng sẵn URL cho từng biến thể một lần khi lưu, thay vì mỗi lần serialize
+    if not isinstance(resource, CloudinaryResource):
+        return None
+
+    return {name: resource.build_url(**options) for name, options in get_variants().items()}
+
+
+def get_resource(instance, field):
+    # Giá trị gán bằng chuỗi public id cũng được đổi sang CloudinaryResource như khi đọc từ DB
+    value = getattr(instance, field)
+    if isinstance(value, str) and value:
+        return instance._meta.get_field(field).to_python(value)
+    return value
+
+
+def refresh_variants(instance, field, urls_field, kwargs):
+    """
+    Gọi trong Model.save() trước super().save(): cập nhật cột URL khi field ảnh có thể đã đổi.
+    Trả về True nếu field đang là file chưa upload; khi đó gọi store_variants() sau super().save(),
+    lúc CloudinaryField.pre_save đã upload và thay file bằng CloudinaryResource.
+    """
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None and field not in update_fields:
+        return False
+
+    if isinstance(getattr(instance, field), UploadedFile):
+        return True
+
+    setattr(instance, urls_field, build_variants(get_resource(instance, field)))
+    if update_fields is not None:
+        kwargs['update_fields'] = {*update_fields, urls_field}
+    return False
+
+
+def store_variants(instance, field, urls_field):
+    urls = build_variants(get_resource(instance, field))
+    setattr(instance, urls_field, urls)
+    # update() để không phát lại signal của lần lưu vừa xong
+    type(instance)._base_manager.filter(pk=instance.pk).update(**{urls_field: urls})
+
+
+def get_variant(request):
+    # Nhận cả request của DRF lẫn HttpRequest thường (?variant=thumb|card|full)
+    variant = getattr(request, 'query_params', request.GET).get('variant') if request is not None else None
+    return variant if variant in get_variants() else DEFAULT_VARIANT
+
+
+def variant_url(urls, resource, variant=DEFAULT_VARIANT):
+    if urls and variant in urls:
+        return urls[variant]
+
+    # Dòng chưa được backfill: dựng URL như trước
+    return resource.url if resource else None
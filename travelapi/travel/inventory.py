@@ -0,0 +1,106 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Case, When, Value, IntegerField
+from django.db.models.functions import Least
+from django.utils import timezone
+
+from travel.models import ServiceSchedule, Booking, SeatHold
+from travel.cache import invalidate_calendar, invalidate_dashboard
+from travel.paginators import bump_count_version
+
+
+class SeatsUnavailable(Exception):
+    pass
+
+
+def reserve_seats(schedule_id, quantity):
+    # Trừ chỗ bằng một câu UPDATE có điều kiện: hai request đồng thời không thể cùng lấy chỗ cuối cùng
+    if quantity <= 0:
+        return
+
+    updated = ServiceSchedule.objects.filter(pk=schedule_id, available__gte=quantity) \
+        .update(available=F('available') - quantity)
+    if not updated:
+        raise SeatsUnavailable()
+
+
+def release_seats(schedule_id, quantity):
+    if quantity <= 0:
+        return
+
+    ServiceSchedule.objects.filter(pk=schedule_id) \
+        .update(available=Least(F('available') + quantity, F('max_participants')))
+
+
+def held_seats(schedule_id, quantity, active):
+    # Booking đang active giữ `quantity` chỗ của lịch trình
+    return (schedule_id, quantity if active else 0)
+
+
+def move_seats(old, new):
+    """Chuyển số chỗ đang giữ từ (schedule_id, qty) cũ sang mới, gọi trong transaction."""
+    if old == new:
+        return
+
+    if old[0] == new[0]:
+        if new[1] > old[1]:
+            reserve_seats(new[0], new[1] - old[1])
+        else:
+            release_seats(new[0], old[1] - new[1])
+        return
+
+    release_seats(*old)
+    reserve_seats(*new)
+
+
+def hold_booking(booking):
+    if booking.payment_status or not booking.active:
+        return None
+
+    expires_at = timezone.now() + timedelta(minutes=getattr(settings, 'SEAT_HOLD_MINUTES', 15))
+    hold, _ = SeatHold.objects.update_or_create(booking=booking,
+                                                defaults={'expires_at': expires_at, 'released': False})
+    return hold
+
+
+def release_expired_holds(batch_size=500):
+    """
+    Trả lại chỗ của các booking chưa thanh toán đã hết hạn giữ chỗ, mỗi lô chỉ dùng vài câu UPDATE.
+    Trả về số hold đã giải phóng.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            holds = list(SeatHold.objects.select_for_update(skip_locked=True)
+                         .filter(released=False, expires_at__lte=timezone.now(),
+                                 booking__active=True, booking__payment_status=False)
+                         .values_list('id', 'booking_id', 'booking__service_schedule_id', 'booking__quantity')
+                         [:batch_size])
+            if not holds:
+                break
+
+            seats = {}
+            for _, _, schedule_id, quantity in holds:
+                seats[schedule_id] = seats.get(schedule_id, 0) + quantity
+
+            ServiceSchedule.objects.filter(pk__in=seats).update(available=Least(
+                F('available') + Case(*[When(pk=pk, then=Value(qty)) for pk, qty in seats.items()],
+                                      output_field=IntegerField()),
+                F('max_participants')))
+            Booking.objects.filter(pk__in=[h[1] for h in holds]).update(active=False)
+            SeatHold.objects.filter(pk__in=[h[0] for h in holds]).update(released=True)
+
+        released += len(holds)
+
+        # update() không phát signal nên tự làm mới lịch chỗ trống đã cache
+        invalidate_calendar(ServiceSchedule.objects.filter(pk__in=seats).values_list('service_id', 'date'))
+        invalidate_dashboard(ServiceSchedule.objects.filter(pk__in=seats)
+                             .values_list('service__provider_id', flat=True))
+
+    if released:
+        bump_count_version(Booking)
+        bump_count_version(ServiceSchedule)
+
+    return released
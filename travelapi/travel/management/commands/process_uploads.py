@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from travel import uploads
+
+
+class Command(BaseCommand):
+    help = 'Upload lại các ảnh còn nằm trong hàng đợi (worker bị dừng giữa chừng hoặc upload lỗi)'
+
+    def handle(self, *args, **options):
+        processed = uploads.retry_stale(getattr(settings, 'UPLOAD_MAX_ATTEMPTS', 3))
+        self.stdout.write(self.style.SUCCESS(f'Đã xử lý {processed} task upload'))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from travel import images
+from travel.models import Image, User
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại URL các biến thể ảnh (IMAGE_VARIANTS) cho Image và avatar của User'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def rebuild(self, model, field, urls_field, batch_size):
+        batch = []
+        updated = 0
+        for obj in model.objects.exclude(**{f'{field}__isnull': True}).only('pk', field).iterator(batch_size):
+            setattr(obj, urls_field, images.build_variants(getattr(obj, field)))
+            batch.append(obj)
+            if len(batch) >= batch_size:
+                updated += len(batch)
+                model.objects.bulk_update(batch, [urls_field])
+                batch = []
+
+        if batch:
+            updated += len(batch)
+            model.objects.bulk_update(batch, [urls_field])
+
+        return updated
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        image_count = self.rebuild(Image, 'path', 'path_urls', batch_size)
+        user_count = self.rebuild(User, 'avatar', 'avatar_urls', batch_size)
+        self.stdout.write(self.style.SUCCESS(f'Đã cập nhật {image_count} ảnh và {user_count} avatar'))
@@ -0,0 +1,26 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from travel.models import RevenueDaily
+
+
+class Command(BaseCommand):
+    help = 'Tính lại bảng RevenueDaily từ các Booking đã thanh toán trong khoảng ngày cho trước'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='Ngày bắt đầu (YYYY-MM-DD), mặc định là toàn bộ')
+        parser.add_argument('--end', help='Ngày kết thúc (YYYY-MM-DD), mặc định là toàn bộ')
+
+    def handle(self, *args, **options):
+        try:
+            start = date.fromisoformat(options['start']) if options['start'] else None
+            end = date.fromisoformat(options['end']) if options['end'] else None
+        except ValueError:
+            raise CommandError('Ngày phải có định dạng YYYY-MM-DD')
+
+        if start and end and start > end:
+            raise CommandError('--start phải nhỏ hơn hoặc bằng --end')
+
+        created = RevenueDaily.rebuild(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Đã tạo {created} dòng RevenueDaily'))
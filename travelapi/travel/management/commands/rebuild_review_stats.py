@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from travel.models import Service
+
+
+class Command(BaseCommand):
+    help = 'Tính lại review_count, star_sum, rating_avg và phân bố star_1..star_5 của Service từ bảng Review'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--service', type=int, nargs='*', help='Chỉ tính lại cho các service id này')
+
+    def handle(self, *args, **options):
+        queryset = Service.objects.all()
+        if options['service']:
+            queryset = queryset.filter(pk__in=options['service'])
+
+        updated = Service.rebuild_review_stats(queryset)
+        self.stdout.write(self.style.SUCCESS(f'Đã cập nhật thống kê đánh giá cho {updated} service'))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from travel import search
+from travel.models import Service, ServiceSearchToken
+
+
+class Command(BaseCommand):
+    help = 'Tạo lại bảng chỉ mục tìm kiếm ServiceSearchToken cho toàn bộ Service'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total = 0
+
+        with transaction.atomic():
+            ServiceSearchToken.objects.all().delete()
+            tokens = []
+            for service in Service.objects.only('id', *search.SEARCH_FIELDS).iterator(chunk_size=batch_size):
+                tokens.extend(search.build_tokens(service))
+                total += 1
+                if len(tokens) >= batch_size:
+                    ServiceSearchToken.objects.bulk_create(tokens)
+                    tokens = []
+            ServiceSearchToken.objects.bulk_create(tokens)
+
+        self.stdout.write(self.style.SUCCESS(f'Đã đánh chỉ mục {total} service'))
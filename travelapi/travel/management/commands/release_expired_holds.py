@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from travel import inventory
+
+
+class Command(BaseCommand):
+    help = 'Trả lại chỗ của các booking chưa thanh toán đã hết hạn giữ chỗ (chạy định kỳ bằng cron)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        released = inventory.release_expired_holds(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Đã giải phóng {released} lượt giữ chỗ'))
@@ -0,0 +1,47 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:04
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def fill_review_stats(apps, schema_editor):
+    Service = apps.get_model('travel', 'Service')
+    active = Q(review__active=True)
+    for service in Service.objects.annotate(count=Count('review', filter=active),
+                                            stars=Sum('review__star', filter=active)).iterator():
+        Service.objects.filter(pk=service.pk).update(review_count=service.count,
+                                                     star_sum=service.stars or 0,
+                                                     rating_avg=(service.stars or 0) / service.count
+                                                     if service.count else 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0006_alter_service_discount'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='rating_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='review_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='booking',
+            name='service_schedule',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='travel.serviceschedule'),
+        ),
+        migrations.RunPython(fill_review_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def fill_revenue_daily(apps, schema_editor):
+    Booking = apps.get_model('travel', 'Booking')
+    RevenueDaily = apps.get_model('travel', 'RevenueDaily')
+    aggregates = Booking.objects.filter(payment_status=True).annotate(day=TruncDate('created_date')) \
+        .values('day', 'service_schedule__service', 'service_schedule__service__provider') \
+        .annotate(count=Count('id'), total_quantity=Sum('quantity'), total_revenue=Sum('total_price'))
+    RevenueDaily.objects.bulk_create([RevenueDaily(provider_id=item['service_schedule__service__provider'],
+                                                   service_id=item['service_schedule__service'],
+                                                   date=item['day'],
+                                                   bookings=item['count'],
+                                                   quantity=item['total_quantity'],
+                                                   revenue=item['total_revenue']) for item in aggregates],
+                                     batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0007_service_review_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RevenueDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('bookings', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='travel.provider')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='travel.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'date'], name='travel_reve_provide_287e3a_idx'), models.Index(fields=['date'], name='travel_reve_date_b6f091_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='revenuedaily',
+            constraint=models.UniqueConstraint(fields=('service', 'date'), name='unique_revenue_daily_service_date'),
+        ),
+        migrations.RunPython(fill_revenue_daily, migrations.RunPython.noop),
+    ]
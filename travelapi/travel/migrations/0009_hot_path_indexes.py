@@ -0,0 +1,33 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0008_revenuedaily'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['customer', 'payment_status', 'active'], name='travel_book_custome_50f9ac_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['service', '-created_date'], name='travel_revi_service_5fa7ee_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['province', 'price'], name='travel_serv_provinc_01b329_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='service',
+            index=models.Index(fields=['service_type', 'price'], name='travel_serv_service_828664_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='serviceschedule',
+            index=models.Index(fields=['service', 'date'], name='travel_serv_service_a459df_idx'),
+        ),
+    ]
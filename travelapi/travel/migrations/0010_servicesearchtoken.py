@@ -0,0 +1,58 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:06
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Chép lại từ travel.search để migration không đổi theo code hiện tại
+TOKEN_MAX_LENGTH = 50
+SEARCH_FIELDS = ('name', 'address')
+
+
+def normalize(text):
+    text = (text or '').lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+
+
+def tokenize(text):
+    tokens = []
+    for token in re.findall(r'\w+', normalize(text)):
+        token = token[:TOKEN_MAX_LENGTH]
+        if token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def fill_search_tokens(apps, schema_editor):
+    Service = apps.get_model('travel', 'Service')
+    ServiceSearchToken = apps.get_model('travel', 'ServiceSearchToken')
+    tokens = [ServiceSearchToken(service_id=service.pk, field=field, token=token)
+              for service in Service.objects.only('id', *SEARCH_FIELDS).iterator()
+              for field in SEARCH_FIELDS for token in tokenize(getattr(service, field))]
+    ServiceSearchToken.objects.bulk_create(tokens, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0009_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceSearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(max_length=10)),
+                ('token', models.CharField(max_length=50)),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='searchtoken', to='travel.service')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['field', 'token'], name='travel_serv_field_ae63da_idx')],
+            },
+        ),
+        migrations.RunPython(fill_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:10
+
+from datetime import timedelta
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def hold_unpaid_bookings(apps, schema_editor):
+    # Booking chưa thanh toán có từ trước cũng được giữ chỗ có thời hạn để release_expired_holds trả chỗ
+    Booking = apps.get_model('travel', 'Booking')
+    SeatHold = apps.get_model('travel', 'SeatHold')
+    expires_at = timezone.now() + timedelta(minutes=getattr(settings, 'SEAT_HOLD_MINUTES', 15))
+    booking_ids = Booking.objects.filter(active=True, payment_status=False).values_list('id', flat=True)
+    SeatHold.objects.bulk_create((SeatHold(booking_id=booking_id, expires_at=expires_at)
+                                  for booking_id in booking_ids.iterator()), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0010_servicesearchtoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SeatHold',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('expires_at', models.DateTimeField()),
+                ('released', models.BooleanField(default=False)),
+                ('booking', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to='travel.booking')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['released', 'expires_at'], name='travel_seat_release_468bb8_idx')],
+            },
+        ),
+        migrations.RunPython(hold_unpaid_bookings, migrations.RunPython.noop),
+    ]
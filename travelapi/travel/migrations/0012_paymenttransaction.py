@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0011_seathold'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PaymentTransaction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_date', models.DateTimeField(auto_now_add=True)),
+                ('updated_date', models.DateTimeField(auto_now=True)),
+                ('active', models.BooleanField(default=True)),
+                ('provider', models.CharField(max_length=20)),
+                ('order_id', models.CharField(max_length=64, unique=True)),
+                ('idempotency_key', models.CharField(max_length=64, unique=True)),
+                ('amount', models.FloatField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('paid', 'Paid'), ('failed', 'Failed'), ('conflict', 'Conflict')], default='pending', max_length=10)),
+                ('provider_ref', models.CharField(blank=True, max_length=64, null=True)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='travel.booking')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0013_uploadtask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='path_urls',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='avatar_urls',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
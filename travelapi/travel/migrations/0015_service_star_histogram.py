@@ -0,0 +1,50 @@
+# Generated by Django 5.0.4 on 2026-10-18 18:19
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def fill_star_histogram(apps, schema_editor):
+    Service = apps.get_model('travel', 'Service')
+    active = Q(review__active=True)
+    histogram = {f'star_{star}': Count('review', filter=active & Q(review__star=star)) for star in range(1, 6)}
+    for service in Service.objects.annotate(**{f'{field}_count': count for field, count in histogram.items()}) \
+            .iterator():
+        Service.objects.filter(pk=service.pk).update(**{field: getattr(service, f'{field}_count')
+                                                        for field in histogram})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0014_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='star_1',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_2',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_3',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_4',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='star_5',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(fill_star_histogram, migrations.RunPython.noop),
+    ]
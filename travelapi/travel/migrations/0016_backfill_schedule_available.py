@@ -0,0 +1,29 @@
+from django.db import migrations
+from django.db.models import Sum, Q
+
+
+def fill_available(apps, schema_editor):
+    # Lịch trình tạo trước khi có giữ chỗ vẫn để available = 0: tính lại từ các booking đang active
+    ServiceSchedule = apps.get_model('travel', 'ServiceSchedule')
+    schedules = ServiceSchedule.objects.annotate(booked=Sum('booking__quantity', filter=Q(booking__active=True)))
+    batch = []
+    for schedule in schedules.iterator():
+        schedule.available = max(schedule.max_participants - (schedule.booked or 0), 0)
+        batch.append(schedule)
+        if len(batch) >= 500:
+            ServiceSchedule.objects.bulk_update(batch, ['available'])
+            batch = []
+
+    if batch:
+        ServiceSchedule.objects.bulk_update(batch, ['available'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('travel', '0015_service_star_histogram'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_available, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,15 @@
-from datetime import timezone
+from datetime import date, datetime, time, timedelta
 
 from django.db import models
+from django.utils import timezone as django_timezone
 from django.contrib.auth.models import AbstractUser
 from ckeditor.fields import RichTextField
 from cloudinary.models import CloudinaryField
-from django.db.models import Avg, Sum
+from django.db.models import Sum, F, Case, When, Value, Count, Q, OuterRef, Subquery
+from django.db.models.functions import TruncDate, Coalesce, Substr, Length, Greatest
+from django.db import transaction
+
+from travel import images
 
 
 class BaseModel(models.Model):
@@ -25,11 +30,21 @@ class Role(models.Model):
 
 class User(AbstractUser):
     avatar = CloudinaryField(null=True)
+    avatar_urls = models.JSONField(null=True, blank=True)
     CCCD = models.CharField(max_length=12, null=False)
     phone = models.CharField(max_length=10, null=False)
     address = models.CharField(max_length=100, null=False)
     role = models.ForeignKey(Role, on_delete=models.PROTECT, null=True)
 
+    def save(self, *args, **kwargs):
+        uploading = images.refresh_variants(self, 'avatar', 'avatar_urls', kwargs)
+        super().save(*args, **kwargs)
+        if uploading:
+            images.store_variants(self, 'avatar', 'avatar_urls')
+
+    def avatar_url(self, variant=images.DEFAULT_VARIANT):
+        return images.variant_url(self.avatar_urls, self.avatar, variant)
+
 
 class Provider(BaseModel):
     name = models.CharField(max_length=100, null=False)
@@ -37,15 +52,74 @@ class Provider(BaseModel):
     user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
 
     def revenue_by_month(self, month, year):
-        services = self.service_set.all()
-        bookings = Booking.objects.filter(
-            service_schedule__service__in=services,
-            created_date__month=month,
-            created_date__year=year,
-            payment_status=True  # Lọc các booking đã thanh toán
-        ).values('service_schedule__service__name').annotate(total_revenue=Sum('total_price'))
-
-        return bookings
+        # Đọc từ bảng tổng hợp RevenueDaily theo khoảng ngày để dùng được index
+        start = date(year, month, 1)
+        end = date(year + month // 12, month % 12 + 1, 1)
+        revenue = RevenueDaily.objects.filter(
+            provider=self,
+            date__gte=start,
+            date__lt=end
+        ).values(service_name=F('service__name')).annotate(total_revenue=Sum('revenue'))
+
+        return revenue
+
+    def dashboard(self, start, end):
+        """Các chỉ số của provider trong khoảng ngày [start, end], tính bằng 4 câu truy vấn tổng hợp."""
+        # Doanh thu và booking đã thanh toán lấy từ bảng tổng hợp theo ngày
+        revenue = {row['service']: row for row in RevenueDaily.objects.filter(
+            provider=self, date__range=(start, end)).values('service').annotate(
+            paid_bookings=Sum('bookings'), quantity=Sum('quantity'), revenue=Sum('revenue'))}
+
+        # Booking chưa thanh toán vẫn còn hiệu lực, tính theo ngày tạo giống RevenueDaily
+        tz = django_timezone.get_current_timezone()
+        pending = {row['service']: row['pending_bookings'] for row in Booking.objects.filter(
+            service_schedule__service__provider=self, active=True, payment_status=False,
+            created_date__gte=datetime.combine(start, time.min, tz),
+            created_date__lt=datetime.combine(end + timedelta(days=1), time.min, tz)).values(
+            service=F('service_schedule__service')).annotate(pending_bookings=Count('id'))}
+
+        # Tỷ lệ lấp đầy theo các lịch trình diễn ra trong khoảng ngày
+        occupancy = {row['service']: row for row in ServiceSchedule.objects.filter(
+            service__provider=self, date__range=(start, end), active=True).values('service').annotate(
+            schedules=Count('id'), capacity=Sum('max_participants'), available=Sum('available'))}
+
+        services = []
+        for service in self.service_set.order_by('id').values('id', 'name', 'active', 'review_count', 'star_sum',
+                                                              'rating_avg'):
+            sold = revenue.get(service['id'], {})
+            seats = occupancy.get(service['id'], {})
+            capacity = seats.get('capacity') or 0
+            booked = capacity - (seats.get('available') or 0)
+            services.append({
+                'service_id': service['id'],
+                'name': service['name'],
+                'active': service['active'],
+                'revenue': sold.get('revenue') or 0,
+                'paid_bookings': sold.get('paid_bookings') or 0,
+                'quantity': sold.get('quantity') or 0,
+                'pending_bookings': pending.get(service['id'], 0),
+                'schedules': seats.get('schedules') or 0,
+                'capacity': capacity,
+                'booked_seats': booked,
+                'occupancy_rate': booked / capacity if capacity else 0,
+                'review_count': service['review_count'],
+                'star_sum': service['star_sum'],
+                'average_rating': service['rating_avg'],
+            })
+
+        def total(key):
+            return sum(service[key] for service in services)
+
+        capacity = total('capacity')
+        review_count = total('review_count')
+        totals = {key: total(key) for key in ('revenue', 'paid_bookings', 'quantity', 'pending_bookings',
+                                              'schedules', 'capacity', 'booked_seats', 'review_count')}
+        totals['occupancy_rate'] = totals['booked_seats'] / capacity if capacity else 0
+        totals['average_rating'] = total('star_sum') / review_count if review_count else 0
+        for service in services:
+            del service['star_sum']
+
+        return {'provider_id': self.pk, 'start': start, 'end': end, 'totals': totals, 'services': services}
 
     def get_all_reviews(self):
         # Lấy tất cả các dịch vụ thuộc về Provider này
@@ -85,8 +159,18 @@ class Province(models.Model):
 
 class Image(models.Model):
     path = CloudinaryField(null=True)
+    path_urls = models.JSONField(null=True, blank=True)
     service = models.ForeignKey('Service', on_delete=models.CASCADE)
 
+    def save(self, *args, **kwargs):
+        uploading = images.refresh_variants(self, 'path', 'path_urls', kwargs)
+        super().save(*args, **kwargs)
+        if uploading:
+            images.store_variants(self, 'path', 'path_urls')
+
+    def url(self, variant=images.DEFAULT_VARIANT):
+        return images.variant_url(self.path_urls, self.path, variant)
+
     def __str__(self):
         return f"Hình của service {self.service}"
 
@@ -102,21 +186,108 @@ class Service(BaseModel):
     provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
     province = models.ForeignKey(Province, on_delete=models.PROTECT)
     reviews = models.ManyToManyField('Customer', through='Review', null=True, blank=True)
+    # Thống kê đánh giá được lưu sẵn, cập nhật mỗi khi Review thay đổi
+    review_count = models.IntegerField(default=0)
+    star_sum = models.IntegerField(default=0)
+    rating_avg = models.FloatField(default=0)
+    # Phân bố số sao (1-5), được cập nhật cùng lúc với review_count
+    star_1 = models.IntegerField(default=0)
+    star_2 = models.IntegerField(default=0)
+    star_3 = models.IntegerField(default=0)
+    star_4 = models.IntegerField(default=0)
+    star_5 = models.IntegerField(default=0)
+
+    STAR_FIELDS = {star: f'star_{star}' for star in range(1, 6)}
+    SUMMARY_FIELDS = ['id', 'review_count', 'rating_avg', *STAR_FIELDS.values()]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['province', 'price']),
+            models.Index(fields=['service_type', 'price']),
+        ]
 
     def __str__(self):
         return self.name
 
     def total_reviews(self):
-        return self.review_set.count()
+        return self.review_count
 
     def average_rating(self):
-        avg_rating = self.review_set.aggregate(Avg('star'))['star__avg']
-        return avg_rating or 0  # Return 0 if there are no reviews
+        return self.rating_avg
+
+    @classmethod
+    def apply_review_delta(cls, service_id, count, stars, histogram=None):
+        # Cộng dồn thay đổi bằng F() để tránh race condition giữa các request
+        # histogram: {số sao: thay đổi} cho các cột star_1..star_5
+        histogram = {star: delta for star, delta in (histogram or {}).items() if star in cls.STAR_FIELDS and delta}
+        if not count and not stars and not histogram:
+            return
+
+        star_updates = {cls.STAR_FIELDS[star]: F(cls.STAR_FIELDS[star]) + delta for star, delta in histogram.items()}
+        with transaction.atomic():
+            cls.objects.filter(pk=service_id).update(review_count=F('review_count') + count,
+                                                     star_sum=F('star_sum') + stars, **star_updates)
+            # Tách riêng vì MySQL dùng giá trị mới trong cùng một câu UPDATE còn SQLite/Postgres thì không
+            cls.objects.filter(pk=service_id).update(rating_avg=cls.rating_avg_expression())
+
+    @classmethod
+    def rebuild_review_stats(cls, queryset=None):
+        queryset = cls.objects.all() if queryset is None else queryset
+        active = Q(review__active=True)
+        updated = 0
+        histogram = {field: Count('review', filter=active & Q(review__star=star))
+                     for star, field in cls.STAR_FIELDS.items()}
+        for service in queryset.annotate(count=Count('review', filter=active),
+                                         stars=Sum('review__star', filter=active),
+                                         **{f'{field}_count': count for field, count in histogram.items()}).iterator():
+            updated += cls.objects.filter(pk=service.pk).update(review_count=service.count,
+                                                                star_sum=service.stars or 0,
+                                                                rating_avg=(service.stars or 0) / service.count
+                                                                if service.count else 0,
+                                                                **{field: getattr(service, f'{field}_count')
+                                                                   for field in histogram})
+
+        return updated
+
+    @classmethod
+    def review_summaries(cls, service_ids):
+        # Chỉ đọc các cột đã tổng hợp sẵn, một truy vấn theo khoá chính cho cả lô
+        return [cls.format_review_summary(row) for row in
+                cls.objects.filter(pk__in=service_ids, active=True).order_by('id').values(*cls.SUMMARY_FIELDS)]
+
+    @classmethod
+    def format_review_summary(cls, row):
+        return {
+            'service_id': row['id'],
+            'review_count': row['review_count'],
+            'average_rating': row['rating_avg'],
+            'histogram': {str(star): row[field] for star, field in cls.STAR_FIELDS.items()},
+        }
+
+    @staticmethod
+    def rating_avg_expression():
+        return Case(When(review_count__gt=0, then=F('star_sum') * 1.0 / F('review_count')),
+                    default=Value(0.0), output_field=models.FloatField())
 
     def get_images(self):
         return self.image_set.all()
 
 
+class ServiceSearchToken(models.Model):
+    # Bảng chỉ mục ngược token -> service, được cập nhật mỗi khi lưu Service
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='searchtoken')
+    field = models.CharField(max_length=10, null=False)
+    token = models.CharField(max_length=50, null=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['field', 'token']),
+        ]
+
+    def __str__(self):
+        return f"{self.token} - {self.service_id}"
+
+
 class Discount(models.Model):
     discount = models.IntegerField(null=False)
 
@@ -132,9 +303,49 @@ class ServiceSchedule(BaseModel):
     end_time = models.TimeField(null=False)
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['service', 'date']),
+        ]
+
     def __str__(self):
         return f"{self.service} - {self.date}"
 
+    @classmethod
+    def calendar(cls, service_ids, start, end):
+        """Sức chứa, số chỗ đã đặt và còn lại theo từng (service, ngày), tính trong một câu truy vấn."""
+        # Cộng số lượng booking theo từng lịch trình bằng subquery để JOIN không nhân bản max_participants
+        booked = Booking.objects.filter(service_schedule=OuterRef('pk')).values('service_schedule') \
+            .annotate(total=Sum('quantity', filter=Q(active=True))).values('total')
+
+        return cls.objects.filter(service__in=service_ids, date__range=(start, end), active=True) \
+            .annotate(booked_quantity=Coalesce(Subquery(booked), 0)) \
+            .values('service', 'date') \
+            .annotate(schedules=Count('id'), capacity=Sum('max_participants'), booked=Sum('booked_quantity')) \
+            .order_by('service', 'date')
+
+    def save(self, *args, **kwargs):
+        # Lịch trình mới mặc định còn đủ chỗ
+        if self._state.adding:
+            if not self.available:
+                self.available = self.max_participants
+            return super().save(*args, **kwargs)
+
+        # available chỉ đổi bằng UPDATE có điều kiện, không ghi đè bằng giá trị cũ đang giữ trong bộ nhớ
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs['update_fields'] = [name for name in update_fields if name != 'available']
+
+        with transaction.atomic():
+            if 'max_participants' in kwargs['update_fields']:
+                # Đổi sức chứa thì số chỗ còn lại dịch theo đúng phần chênh lệch
+                ServiceSchedule.objects.filter(pk=self.pk).exclude(max_participants=self.max_participants) \
+                    .update(available=Greatest(F('available') + self.max_participants - F('max_participants'), 0))
+            super().save(*args, **kwargs)
+
+        self.refresh_from_db(fields=['available'])
+
 
 class Booking(BaseModel):
     full_name = models.CharField(max_length=50, null=False, default='')
@@ -147,9 +358,94 @@ class Booking(BaseModel):
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE)
     service_schedule = models.ForeignKey(ServiceSchedule, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['customer', 'payment_status', 'active']),
+        ]
+
     def __str__(self):
         return f"{self.full_name} - {self.service_schedule}"
 
+    def revenue_contribution(self, service_id=None, provider_id=None):
+        # Booking chỉ được tính doanh thu khi đã thanh toán
+        if not self.payment_status:
+            return None
+
+        if service_id is None:
+            service = self.service_schedule.service
+            service_id, provider_id = service.id, service.provider_id
+
+        return {
+            'service_id': service_id,
+            'provider_id': provider_id,
+            'date': django_timezone.localdate(self.created_date),
+            'bookings': 1,
+            'quantity': self.quantity,
+            'revenue': self.total_price
+        }
+
+
+class SeatHold(models.Model):
+    # Chỗ của booking chưa thanh toán chỉ được giữ đến expires_at
+    booking = models.OneToOneField(Booking, on_delete=models.CASCADE)
+    expires_at = models.DateTimeField(null=False)
+    released = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['released', 'expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.booking} - {self.expires_at}"
+
+
+class PaymentTransaction(BaseModel):
+    PENDING = 'pending'
+    PAID = 'paid'
+    FAILED = 'failed'
+    # Tiền đã về nhưng lịch trình đã hết chỗ, cần hoàn tiền
+    CONFLICT = 'conflict'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (PAID, 'Paid'), (FAILED, 'Failed'), (CONFLICT, 'Conflict')]
+
+    booking = models.ForeignKey(Booking, on_delete=models.PROTECT)
+    provider = models.CharField(max_length=20, null=False)
+    order_id = models.CharField(max_length=64, unique=True)
+    idempotency_key = models.CharField(max_length=64, unique=True)
+    amount = models.FloatField(null=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    provider_ref = models.CharField(max_length=64, null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.provider} - {self.order_id}"
+
+
+class UploadTask(models.Model):
+    # Hàng đợi upload ảnh: file đã được lưu tạm trên đĩa, worker sẽ đẩy lên storage rồi ghi vào field
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (PROCESSING, 'Processing'), (FAILED, 'Failed')]
+
+    model = models.CharField(max_length=50, null=False)
+    object_id = models.BigIntegerField(null=False)
+    field = models.CharField(max_length=50, null=False)
+    staged_path = models.CharField(max_length=255, null=False)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.IntegerField(default=0)
+    error = models.TextField(null=True, blank=True)
+    created_date = models.DateTimeField(auto_now_add=True)
+    updated_date = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'updated_date']),
+        ]
+
+    def __str__(self):
+        return f"{self.model}#{self.object_id}.{self.field} - {self.status}"
+
 
 class Review(BaseModel):
     star = models.IntegerField(null=False)
@@ -157,5 +453,87 @@ class Review(BaseModel):
     customer = models.ForeignKey(Customer, on_delete=models.PROTECT)
     service = models.ForeignKey(Service, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['service', '-created_date']),
+        ]
+
     def __str__(self):
         return f"{self.customer} - {self.service}"
+
+    @classmethod
+    def feed(cls, service_id, excerpt_length=None):
+        # Một câu JOIN review - customer - user, chỉ lấy các cột hiển thị;
+        # excerpt_length cắt content ngay trong SQL để không kéo cả RichText về.
+        # Lấy dư gấp 4 lần vì phần thẻ HTML sẽ bị bỏ đi khi tạo đoạn trích
+        content = Substr('content', 1, excerpt_length * 4) if excerpt_length else F('content')
+        queryset = cls.objects.filter(service_id=service_id).order_by('-created_date', '-id').values(
+            'id', 'star', 'created_date', 'updated_date', content_text=content,
+            customer_name=F('customer__full_name'), customer_avatar=F('customer__user__avatar'),
+            customer_avatar_urls=F('customer__user__avatar_urls'))
+        if excerpt_length:
+            queryset = queryset.annotate(content_length=Length('content'))
+
+        return queryset
+
+
+class RevenueDaily(models.Model):
+    provider = models.ForeignKey(Provider, on_delete=models.CASCADE)
+    service = models.ForeignKey(Service, on_delete=models.CASCADE)
+    date = models.DateField(null=False)
+    bookings = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['service', 'date'], name='unique_revenue_daily_service_date')
+        ]
+        indexes = [
+            models.Index(fields=['provider', 'date']),
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f"{self.service} - {self.date}"
+
+    @classmethod
+    def apply(cls, contribution, sign=1):
+        if not contribution:
+            return
+
+        with transaction.atomic():
+            rows = cls.objects.filter(service_id=contribution['service_id'], date=contribution['date'])
+            if sign > 0:
+                # Chỉ tạo dòng mới khi cộng vào, khi trừ thì dòng phải có sẵn
+                cls.objects.get_or_create(service_id=contribution['service_id'], date=contribution['date'],
+                                          defaults={'provider_id': contribution['provider_id']})
+            rows.update(bookings=F('bookings') + sign * contribution['bookings'],
+                        quantity=F('quantity') + sign * contribution['quantity'],
+                        revenue=F('revenue') + sign * contribution['revenue'])
+
+    @classmethod
+    def rebuild(cls, start=None, end=None):
+        bookings = Booking.objects.filter(payment_status=True).annotate(day=TruncDate('created_date'))
+        rows = cls.objects.all()
+        if start:
+            bookings = bookings.filter(day__gte=start)
+            rows = rows.filter(date__gte=start)
+        if end:
+            bookings = bookings.filter(day__lte=end)
+            rows = rows.filter(date__lte=end)
+
+        aggregates = bookings.values('day', 'service_schedule__service', 'service_schedule__service__provider') \
+            .annotate(count=Count('id'), total_quantity=Sum('quantity'), total_revenue=Sum('total_price'))
+
+        with transaction.atomic():
+            rows.delete()
+            created = cls.objects.bulk_create([cls(provider_id=item['service_schedule__service__provider'],
+                                                   service_id=item['service_schedule__service'],
+                                                   date=item['day'],
+                                                   bookings=item['count'],
+                                                   quantity=item['total_quantity'],
+                                                   revenue=item['total_revenue']) for item in aggregates],
+                                              batch_size=500)
+
+        return len(created)
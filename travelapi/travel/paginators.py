@@ -1,7 +1,238 @@
+import base64
+import hashlib
+import json
+from collections.abc import Mapping
+from datetime import datetime, time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.utils.functional import cached_property
 from rest_framework import pagination
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(pagination.BasePagination):
+    """
+    Phân trang theo con trỏ (keyset): trang sau lọc theo giá trị của dòng cuối trang trước
+    thay vì OFFSET, nên trang sâu cũng nhanh như trang đầu.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 4
+    ordering = ('-created_date', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self, page_size=None):
+        if page_size:
+            self.page_size = page_size
+
+    def get_ordering(self, queryset, view=None):
+        ordering = [o for o in queryset.query.order_by if isinstance(o, str)]
+        if not ordering:
+            ordering = list(getattr(view, 'cursor_ordering', self.ordering))
+
+        # Thêm id để khoá sắp xếp luôn duy nhất
+        if not {'id', '-id', 'pk', '-pk'} & set(ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+
+        return ordering
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset, view)
+
+        position = self.decode_cursor(request, queryset.model)
+        if position:
+            queryset = queryset.filter(self.build_filter(position))
+
+        results = list(queryset.order_by(*self.ordering)[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+
+        last = self.page[-1]
+        position = [self.get_value(last, field.lstrip('-')) for field in self.ordering]
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param,
+                                   self.encode_cursor(position))
+
+    def build_filter(self, position):
+        # (a, b) > (x, y)  <=>  a > x OR (a = x AND b > y)
+        condition = Q()
+        for i, field in enumerate(self.ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': position[i]})
+            for prev_field, prev_value in zip(self.ordering[:i], position[:i]):
+                step &= Q(**{prev_field.lstrip('-'): prev_value})
+            condition |= step
+
+        return condition
+
+    @staticmethod
+    def get_value(obj, path):
+        # Dòng của queryset .values() là dict, khoá chính là đường dẫn trường
+        if isinstance(obj, Mapping):
+            return obj[path]
+
+        for attr in path.split('__'):
+            obj = getattr(obj, attr)
+        return obj
+
+    @staticmethod
+    def resolve_field(model, path):
+        field = None
+        for name in path.split('__'):
+            try:
+                field = model._meta.pk if name == 'pk' else model._meta.get_field(name)
+            except FieldDoesNotExist:
+                # Trường annotate (vd. search_rank) giữ nguyên giá trị JSON
+                return None
+            model = field.related_model or model
+        return field
+
+    def encode_cursor(self, position):
+        # isoformat() giữ đủ micro giây; DjangoJSONEncoder cắt còn mili giây làm trang sau bỏ sót dòng
+        position = [value.isoformat() if isinstance(value, (datetime, time)) else value for value in position]
+        raw = json.dumps(position, cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    def decode_cursor(self, request, model):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None
+
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+            if not isinstance(position, list) or len(position) != len(self.ordering):
+                raise ValueError
+            values = []
+            for field, value in zip(self.ordering, position):
+                model_field = self.resolve_field(model, field.lstrip('-'))
+                values.append(model_field.to_python(value) if model_field and value is not None else value)
+        except Exception:
+            raise NotFound(self.invalid_cursor_message)
+
+        return values
+
+
+class KeysetOptInMixin:
+    # Client gửi ?cursor= (để trống ở trang đầu) để chuyển sang phân trang theo con trỏ
+    keyset_pagination_class = KeysetPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if self.keyset_pagination_class.cursor_query_param in request.query_params:
+            self.keyset = self.keyset_pagination_class(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+
+        return super().get_paginated_response(data)
+
+
+def count_version_key(model):
+    return f'count-version:{model._meta.label_lower}'
+
+
+def bump_count_version(model):
+    # Đổi version làm mọi count đã cache của model này hết hiệu lực ngay
+    key = count_version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def estimate_table_rows(queryset):
+    """Số dòng ước lượng từ thống kê của DB, chỉ dùng cho queryset không có điều kiện lọc."""
+    if queryset.query.where or queryset.query.distinct or queryset.query.is_sliced:
+        return None
+
+    connection = connections[queryset.db]
+    if connection.vendor not in ('mysql', 'postgresql'):
+        return None
+
+    # Thống kê của DB vốn chỉ gần đúng, nhớ theo bảng để mỗi lần trượt cache count không tốn thêm một truy vấn
+    key = f'count-estimate:{queryset.db}:{queryset.model._meta.label_lower}'
+    rows = cache.get(key)
+    if rows is None:
+        table = queryset.model._meta.db_table
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                cursor.execute('SELECT TABLE_ROWS FROM information_schema.TABLES '
+                               'WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s', [table])
+            else:
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE relname = %s', [table])
+            row = cursor.fetchone()
+
+        # -1: DB không có thống kê cho bảng này
+        rows = row[0] if row and row[0] is not None else -1
+        cache.set(key, rows, getattr(settings, 'PAGINATION_COUNT_ESTIMATE_TIMEOUT', 3600))
+
+    return rows if rows >= 0 else None
+
+
+class CachedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+
+        version = cache.get(count_version_key(queryset.model), 0)
+        sql, params = queryset.order_by().query.sql_with_params()
+        digest = hashlib.md5(f'{sql}{params}'.encode()).hexdigest()
+        key = f'count:{queryset.model._meta.label_lower}:{version}:{digest}'
+
+        count = cache.get(key)
+        if count is None:
+            threshold = getattr(settings, 'PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+            estimate = estimate_table_rows(queryset) if threshold is not None else None
+            count = estimate if estimate is not None and estimate >= threshold else queryset.count()
+            cache.set(key, count, getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 60))
+
+        return count
+
+
+class CachedCountPageNumberPagination(pagination.PageNumberPagination):
+    # Cache COUNT(*) theo câu truy vấn đã lọc, hết hạn sau TTL ngắn hoặc khi model có thay đổi
+    django_paginator_class = CachedCountPaginator
 
 
-class ServicePaginator(pagination.PageNumberPagination):
+class ServicePaginator(KeysetOptInMixin, CachedCountPageNumberPagination):
     page_size = 4
 
 
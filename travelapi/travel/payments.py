@@ -0,0 +1,269 @@
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from datetime import datetime
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction, IntegrityError
+from django.http import JsonResponse, HttpResponse
+
+from travel import http, inventory
+from travel.cache import invalidate_calendar, invalidate_dashboard
+from travel.models import Booking, PaymentTransaction, RevenueDaily, SeatHold
+from travel.paginators import bump_count_version
+
+
+def sign(key, raw):
+    return hmac.new(key.encode(), raw.encode(), hashlib.sha256).hexdigest()
+
+
+class PaymentProvider:
+    """Cổng thanh toán: tạo yêu cầu thanh toán và xác thực callback/IPN bằng HMAC."""
+    name = None
+    method = None
+
+    def __init__(self):
+        self.config = settings.PAYMENT_PROVIDERS[self.name]
+
+    def new_order_id(self):
+        raise NotImplementedError
+
+    def build_request(self, payment):
+        """Trả về kwargs cho http.apost (json=... hoặc data=...)."""
+        raise NotImplementedError
+
+    def is_accepted(self, data):
+        raise NotImplementedError
+
+    def parse_callback(self, request):
+        """Trả về (order_id, amount, provider_ref, thành công?) hoặc None nếu chữ ký sai."""
+        raise NotImplementedError
+
+    def callback_response(self, ok):
+        raise NotImplementedError
+
+
+class MoMoProvider(PaymentProvider):
+    name = 'momo'
+    method = 'MoMo'
+    IPN_FIELDS = ['amount', 'extraData', 'message', 'orderId', 'orderInfo', 'orderType', 'partnerCode', 'payType',
+                  'requestId', 'responseTime', 'resultCode', 'transId']
+
+    def new_order_id(self):
+        return f"{self.config['partner_code']}{uuid.uuid4().hex}"
+
+    def build_request(self, payment):
+        c = self.config
+        order_info = 'pay with MoMo'
+        request_type = 'payWithMethod'
+        extra_data = ''
+        raw = f"accessKey={c['access_key']}&amount={int(payment.amount)}&extraData={extra_data}" \
+              f"&ipnUrl={c['ipn_url']}&orderId={payment.order_id}&orderInfo={order_info}" \
+              f"&partnerCode={c['partner_code']}&redirectUrl={c['redirect_url']}" \
+              f"&requestId={payment.order_id}&requestType={request_type}"
+
+        return {'json': {
+            "partnerCode": c['partner_code'],
+            "partnerName": "Test",
+            "storeId": "MomoTestStore",
+            "requestId": payment.order_id,
+            "amount": int(payment.amount),
+            "orderId": payment.order_id,
+            "orderInfo": order_info,
+            "redirectUrl": c['redirect_url'],
+            "ipnUrl": c['ipn_url'],
+            "lang": 'vi',
+            "requestType": request_type,
+            "autoCapture": True,
+            "extraData": extra_data,
+            "orderGroupId": '',
+            "signature": sign(c['secret_key'], raw)
+        }}
+
+    def is_accepted(self, data):
+        return data.get('resultCode') == 0
+
+    def parse_callback(self, request):
+        data = json.loads(request.body)
+        raw = f"accessKey={self.config['access_key']}&" + '&'.join(f"{f}={data.get(f, '')}" for f in self.IPN_FIELDS)
+        if not hmac.compare_digest(sign(self.config['secret_key'], raw), str(data.get('signature', ''))):
+            return None
+
+        return data.get('orderId'), data.get('amount'), str(data.get('transId')), data.get('resultCode') == 0
+
+    def callback_response(self, ok):
+        # MoMo chỉ cần HTTP 204 để xác nhận đã nhận IPN
+        return HttpResponse(status=204 if ok else 400)
+
+
+class ZaloPayProvider(PaymentProvider):
+    name = 'zalopay'
+    method = 'ZaloPay'
+
+    def new_order_id(self):
+        # mã giao dịch có định dạng yyMMdd_xxxx
+        return "{:%y%m%d}_{}".format(datetime.today(), uuid.uuid4().hex[:20])
+
+    def build_request(self, payment):
+        c = self.config
+        order = {
+            "app_id": c['app_id'],
+            "app_trans_id": payment.order_id,
+            "app_user": str(payment.booking.customer_id),
+            "app_time": int(round(time.time() * 1000)),  # miliseconds
+            "embed_data": json.dumps({}),
+            "item": json.dumps([{}]),
+            "amount": int(payment.amount),
+            "description": f"Thanh toán booking #{payment.booking_id}",
+            "bank_code": "",
+            "callback_url": c['callback_url'],
+        }
+        data = "{}|{}|{}|{}|{}|{}|{}".format(order["app_id"], order["app_trans_id"], order["app_user"],
+                                             order["amount"], order["app_time"], order["embed_data"], order["item"])
+        order["mac"] = sign(c['key1'], data)
+
+        return {'data': order}
+
+    def is_accepted(self, data):
+        return data.get('return_code') == 1
+
+    def parse_callback(self, request):
+        body = json.loads(request.body)
+        if not hmac.compare_digest(sign(self.config['key2'], body.get('data', '')), str(body.get('mac', ''))):
+            return None
+
+        # ZaloPay chỉ gọi callback khi giao dịch thành công
+        data = json.loads(body['data'])
+        return data.get('app_trans_id'), data.get('amount'), str(data.get('zp_trans_id')), True
+
+    def callback_response(self, ok):
+        if ok:
+            return JsonResponse({"return_code": 1, "return_message": "success"})
+        return JsonResponse({"return_code": -1, "return_message": "mac not equal"})
+
+
+PROVIDERS = {provider.name: provider for provider in (MoMoProvider, ZaloPayProvider)}
+
+
+def get_provider(name):
+    return PROVIDERS[name]()
+
+
+async def create_payment(request, provider_name):
+    try:
+        return await _create_payment(request, provider_name)
+    finally:
+        if not isinstance(request, ASGIRequest):
+            # Event loop của view async dưới WSGI kết thúc cùng request, đóng client để không rò pool kết nối
+            await http.aclose_async_client()
+
+
+async def _create_payment(request, provider_name):
+    provider = get_provider(provider_name)
+
+    booking_id = request.headers.get('booking-id') or request.GET.get('booking_id')
+    if not booking_id:
+        return JsonResponse({"error": "booking_id is required"}, status=400)
+    try:
+        booking_id = int(booking_id)
+    except ValueError:
+        return JsonResponse({"error": "booking_id không hợp lệ"}, status=400)
+
+    booking = await Booking.objects.filter(pk=booking_id).afirst()
+    if booking is None:
+        return JsonResponse({"error": "Booking không tồn tại"}, status=404)
+    if booking.payment_status:
+        return JsonResponse({"error": "Booking đã được thanh toán"}, status=409)
+
+    # Gửi lại cùng Idempotency-Key sẽ nhận lại đúng giao dịch cũ thay vì tạo giao dịch mới
+    key = request.headers.get('Idempotency-Key') or uuid.uuid4().hex
+    try:
+        payment, created = await PaymentTransaction.objects.select_related('booking').aget_or_create(
+            idempotency_key=key,
+            defaults={'booking': booking, 'provider': provider.name, 'order_id': provider.new_order_id(),
+                      'amount': round(booking.total_price)})
+    except IntegrityError:
+        payment, created = await PaymentTransaction.objects.select_related('booking').aget(idempotency_key=key), False
+
+    if payment.booking_id != booking.pk or payment.provider != provider.name:
+        return JsonResponse({"error": "Idempotency-Key đã được dùng cho giao dịch khác"}, status=409)
+    if not created and payment.response is not None:
+        return JsonResponse({**payment.response, 'order_id': payment.order_id})
+
+    try:
+        response = await http.apost(provider.config['endpoint'], **provider.build_request(payment))
+        data = response.json()
+    except Exception as e:
+        return JsonResponse({"error": str(e)})
+
+    payment.response = data
+    if not provider.is_accepted(data):
+        payment.status = PaymentTransaction.FAILED
+    await payment.asave(update_fields=['response', 'status', 'updated_date'])
+
+    return JsonResponse({**data, 'order_id': payment.order_id})
+
+
+def mark_paid(payment_id, provider_ref):
+    """Ghi nhận giao dịch thành công và chuyển booking sang đã thanh toán, an toàn khi IPN gửi lặp lại."""
+    with transaction.atomic():
+        payment = PaymentTransaction.objects.select_for_update().get(pk=payment_id)
+        if payment.status in (PaymentTransaction.PAID, PaymentTransaction.CONFLICT):
+            return payment
+
+        booking = Booking.objects.select_for_update().select_related('service_schedule__service') \
+            .get(pk=payment.booking_id)
+        if not booking.active:
+            # Hết hạn giữ chỗ trước khi tiền về: chỉ nhận nếu còn đủ chỗ
+            try:
+                inventory.reserve_seats(booking.service_schedule_id, booking.quantity)
+            except inventory.SeatsUnavailable:
+                payment.status = PaymentTransaction.CONFLICT
+                payment.provider_ref = provider_ref
+                payment.save(update_fields=['status', 'provider_ref', 'updated_date'])
+                return payment
+
+        updated = Booking.objects.filter(pk=booking.pk, payment_status=False) \
+            .update(payment_status=True, active=True, payment_method=PROVIDERS[payment.provider].method)
+        payment.status = PaymentTransaction.PAID
+        payment.provider_ref = provider_ref
+        payment.save(update_fields=['status', 'provider_ref', 'updated_date'])
+
+        if updated:
+            # update() không phát signal nên tự cập nhật doanh thu, giữ chỗ và cache
+            booking.payment_status = True
+            RevenueDaily.apply(booking.revenue_contribution())
+            SeatHold.objects.filter(booking=booking).delete()
+
+    if updated:
+        bump_count_version(Booking)
+        invalidate_calendar([(booking.service_schedule.service_id, booking.service_schedule.date)])
+        invalidate_dashboard([booking.service_schedule.service.provider_id])
+
+    return payment
+
+
+def handle_callback(request, provider_name):
+    provider = get_provider(provider_name)
+    try:
+        result = provider.parse_callback(request)
+    except (ValueError, KeyError):
+        result = None
+    if result is None:
+        return provider.callback_response(False)
+
+    order_id, amount, provider_ref, success = result
+    payment = PaymentTransaction.objects.filter(order_id=order_id, provider=provider.name).first()
+    if payment is None or int(amount or 0) != int(payment.amount):
+        return provider.callback_response(False)
+
+    if success:
+        mark_paid(payment.pk, provider_ref)
+    else:
+        PaymentTransaction.objects.filter(pk=payment.pk, status=PaymentTransaction.PENDING) \
+            .update(status=PaymentTransaction.FAILED, provider_ref=provider_ref)
+
+    return provider.callback_response(True)
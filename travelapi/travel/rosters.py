@@ -0,0 +1,82 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from travel import images
+from travel.models import Booking
+
+ROSTER_FIELDS = ['full_name', 'phone', 'address', 'avatar']
+
+
+def _roster_queryset(schedule_id):
+    # Một câu JOIN booking - customer - user, chỉ lấy các cột cần dùng
+    return Booking.objects.filter(service_schedule_id=schedule_id).values(
+        'customer__full_name', 'customer__user__phone', 'customer__user__address',
+        'customer__user__avatar', 'customer__user__avatar_urls').order_by('id')
+
+
+def _roster_row(row, variant):
+    return {
+        'full_name': row['customer__full_name'],
+        'phone': row['customer__user__phone'],
+        'address': row['customer__user__address'],
+        'avatar': images.variant_url(row['customer__user__avatar_urls'], row['customer__user__avatar'], variant),
+    }
+
+
+def roster_rows(schedule_id, variant=images.DEFAULT_VARIANT, chunk_size=500):
+    for row in _roster_queryset(schedule_id).iterator(chunk_size):
+        yield _roster_row(row, variant)
+
+
+async def aroster_rows(schedule_id, variant=images.DEFAULT_VARIANT, chunk_size=500):
+    # Dùng khi chạy qua ASGI: Django gom hết iterator đồng bộ của StreamingHttpResponse vào bộ nhớ
+    # trước khi gửi, chỉ iterator bất đồng bộ mới thật sự được stream
+    async for row in _roster_queryset(schedule_id).aiterator(chunk_size):
+        yield _roster_row(row, variant)
+
+
+def _json_item(index, row):
+    return (',' if index else '') + json.dumps(row, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+def stream_json(rows):
+    # Ghi mảng JSON từng phần tử một, không dựng cả danh sách trong bộ nhớ
+    yield '['
+    for i, row in enumerate(rows):
+        yield _json_item(i, row)
+    yield ']'
+
+
+async def astream_json(rows):
+    yield '['
+    i = 0
+    async for row in rows:
+        yield _json_item(i, row)
+        i += 1
+    yield ']'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def _csv_writer():
+    return csv.DictWriter(_Echo(), fieldnames=ROSTER_FIELDS)
+
+
+def stream_csv(rows):
+    writer = _csv_writer()
+    # BOM để Excel đọc đúng tiếng Việt
+    yield '\ufeff' + writer.writeheader()
+    for row in rows:
+        yield writer.writerow(row)
+
+
+async def astream_csv(rows):
+    writer = _csv_writer()
+    yield '\ufeff' + writer.writeheader()
+    async for row in rows:
+        yield writer.writerow(row)
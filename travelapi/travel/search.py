@@ -0,0 +1,73 @@
+import re
+import unicodedata
+
+from django.db.models import Count, Case, When, Value, Q, IntegerField
+
+TOKEN_MAX_LENGTH = 50
+SEARCH_FIELDS = ('name', 'address')
+
+
+def normalize(text):
+    # Bỏ dấu tiếng Việt để "Hà Nội", "ha noi", "HÀ NỘI" đều khớp nhau
+    text = (text or '').lower().replace('đ', 'd')
+    text = unicodedata.normalize('NFD', text)
+    return ''.join(c for c in text if unicodedata.category(c) != 'Mn')
+
+
+def tokenize(text):
+    tokens = []
+    for token in re.findall(r'\w+', normalize(text)):
+        token = token[:TOKEN_MAX_LENGTH]
+        if token not in tokens:
+            tokens.append(token)
+    return tokens
+
+
+def build_tokens(service):
+    from travel.models import ServiceSearchToken
+
+    return [ServiceSearchToken(service_id=service.pk, field=field, token=token)
+            for field in SEARCH_FIELDS for token in tokenize(getattr(service, field))]
+
+
+def index_service(service):
+    from travel.models import ServiceSearchToken
+
+    ServiceSearchToken.objects.filter(service_id=service.pk).delete()
+    ServiceSearchToken.objects.bulk_create(build_tokens(service))
+
+
+def _term_filter(field, terms):
+    # Token và từ khoá đều đã chuẩn hoá chữ thường nên dùng startswith (LIKE 'abc%'), không cần
+    # istartswith vốn sinh UPPER()/ILIKE làm DB bỏ qua index
+    condition = Q()
+    for term in terms:
+        condition |= Q(searchtoken__token__startswith=term)
+    return Q(searchtoken__field=field) & condition
+
+
+def search(queryset, q):
+    """Lọc các service khớp với bất kỳ từ nào trong q, kèm search_rank là số từ khớp."""
+    terms = tokenize(q)
+    if not terms:
+        return queryset.none().annotate(search_rank=Value(0, output_field=IntegerField()))
+
+    matched_term = Case(*[When(searchtoken__token__startswith=term, then=Value(i))
+                          for i, term in enumerate(terms)], output_field=IntegerField())
+
+    return queryset.filter(_term_filter('name', terms)).annotate(search_rank=Count(matched_term, distinct=True))
+
+
+def filter_all_terms(queryset, field, text):
+    """Lọc các service có field chứa tất cả các từ trong text."""
+    from travel.models import ServiceSearchToken
+
+    terms = tokenize(text)
+    if not terms:
+        return queryset.none()
+
+    for term in terms:
+        service_ids = ServiceSearchToken.objects.filter(field=field, token__startswith=term).values('service_id')
+        queryset = queryset.filter(pk__in=service_ids)
+
+    return queryset
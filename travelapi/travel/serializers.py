@@ -1,6 +1,11 @@
+from datetime import timedelta
+
+from django.db.models import Sum
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
+from travel import images, hashers
+
 from travel.models import Role, User, Provider, Customer, ServiceType, Province, Image, Service, Discount, \
     ServiceSchedule, Booking, Review
 
@@ -24,17 +29,14 @@ class UserSerializer(serializers.ModelSerializer):
 
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        if instance.avatar:
-            rep['avatar'] = instance.avatar.url
-        else:
-            rep['avatar'] = None  # hoặc một giá trị mặc định nào đó
+        rep['avatar'] = instance.avatar_url(images.get_variant(self.context.get('request')))
 
         return rep
 
     def create(self, validated_data):
         data = validated_data.copy()
         user = User(**data)
-        user.set_password(user.password)
+        user.password = hashers.make_password(user.password)
         user.save()
 
         return user
@@ -77,7 +79,9 @@ class ProvinceSerializer(serializers.ModelSerializer):
 class ImageSerializer(serializers.ModelSerializer):
     def to_representation(self, instance):
         rep = super().to_representation(instance)
-        rep['path'] = instance.path.url
+        # Ảnh vừa tải lên chưa có path cho đến khi worker upload xong
+        rep['path'] = instance.url(images.get_variant(self.context.get('request')))
+        rep['upload_status'] = 'done' if instance.path else 'pending'
 
         return rep
 
@@ -99,13 +103,14 @@ class ServiceSerializer(serializers.ModelSerializer):
     discount = DiscountSerializer()
 
     def get_total_reviews(self, obj):
-        return obj.review_set.count()
+        return obj.total_reviews()
 
     def get_average_rating(self, obj):
         return obj.average_rating()
 
     def get_images(self, obj):
-        return [image.path.url for image in obj.get_images()]
+        variant = images.get_variant(self.context.get('request'))
+        return [image.url(variant) for image in obj.get_images() if image.path]
 
     class Meta:
         model = Service
@@ -121,17 +126,122 @@ class Service01Serializer(serializers.ModelSerializer):
 
 
 class ServiceScheduleSerializer(serializers.ModelSerializer):
+    def validate_max_participants(self, value):
+        # Không cho giảm sức chứa xuống dưới số chỗ đã đặt
+        if self.instance is not None:
+            booked = self.instance.booking_set.filter(active=True).aggregate(total=Sum('quantity'))['total'] or 0
+            if value < booked:
+                raise ValidationError(f"max_participants không được nhỏ hơn số chỗ đã đặt ({booked}).")
+
+        return value
+
     class Meta:
         model = ServiceSchedule
         fields = '__all__'
+        read_only_fields = ['available']
+
+
+class ScheduleTimeSerializer(serializers.Serializer):
+    start_time = serializers.TimeField()
+    end_time = serializers.TimeField()
+
+    def validate(self, attrs):
+        if attrs['start_time'] >= attrs['end_time']:
+            raise ValidationError("start_time phải nhỏ hơn end_time.")
+
+        return attrs
+
+
+class ScheduleRecurrenceSerializer(serializers.Serializer):
+    MAX_SCHEDULES = 1000
+    MAX_DAYS = 366
+
+    service = serializers.PrimaryKeyRelatedField(queryset=Service.objects.all())
+    start_date = serializers.DateField()
+    end_date = serializers.DateField()
+    # 0 = thứ Hai ... 6 = Chủ nhật, bỏ trống là mọi ngày
+    weekdays = serializers.ListField(child=serializers.IntegerField(min_value=0, max_value=6), required=False,
+                                     default=list)
+    times = ScheduleTimeSerializer(many=True, allow_empty=False)
+    max_participants = serializers.IntegerField(min_value=1)
+
+    def validate_times(self, value):
+        # Bỏ các khung giờ trùng giờ bắt đầu để không tạo hai lịch trình cho cùng một suất
+        times = {}
+        for time in value:
+            times.setdefault(time['start_time'], time)
+
+        return list(times.values())
+
+    def validate(self, attrs):
+        if attrs['start_date'] > attrs['end_date']:
+            raise ValidationError("start_date phải nhỏ hơn hoặc bằng end_date.")
+
+        if (attrs['end_date'] - attrs['start_date']).days >= self.MAX_DAYS:
+            raise ValidationError(f"Chỉ được tạo lịch trong tối đa {self.MAX_DAYS} ngày.")
+
+        if len(self.get_occurrences(attrs)) > self.MAX_SCHEDULES:
+            raise ValidationError(f"Chỉ được tạo tối đa {self.MAX_SCHEDULES} lịch trình mỗi lần.")
+
+        return attrs
+
+    @staticmethod
+    def get_occurrences(attrs):
+        weekdays = set(attrs['weekdays'])
+        occurrences = []
+        day = attrs['start_date']
+        while day <= attrs['end_date']:
+            if not weekdays or day.weekday() in weekdays:
+                occurrences.extend((day, time['start_time'], time['end_time']) for time in attrs['times'])
+            day += timedelta(days=1)
+
+        return occurrences
 
 
 class BookingSerializer(serializers.ModelSerializer):
+    def validate_quantity(self, value):
+        if value <= 0:
+            raise ValidationError("Số lượng phải lớn hơn 0.")
+
+        return value
+
     class Meta:
         model = Booking
         fields = '__all__'
 
 
+class BookingCardSerializer(serializers.ModelSerializer):
+    # Dùng với queryset đã select_related('service_schedule__service')
+    # và prefetch_related('service_schedule__service__image_set')
+    service_id = serializers.IntegerField(source='service_schedule.service.id')
+    service_name = serializers.CharField(source='service_schedule.service.name')
+    service_address = serializers.CharField(source='service_schedule.service.address')
+    service_images = serializers.SerializerMethodField()
+    date = serializers.DateField(source='service_schedule.date')
+    start_time = serializers.TimeField(source='service_schedule.start_time')
+    end_time = serializers.TimeField(source='service_schedule.end_time')
+
+    def get_service_images(self, obj):
+        variant = images.get_variant(self.context.get('request'))
+        return [image.url(variant) for image in obj.service_schedule.service.get_images() if image.path]
+
+    class Meta:
+        model = Booking
+        fields = ['id', 'service_id', 'service_name', 'service_address', 'service_images', 'date', 'start_time',
+                  'end_time', 'quantity']
+
+
+class UnpaidBookingCardSerializer(BookingCardSerializer):
+    hold_expires_at = serializers.SerializerMethodField()
+
+    def get_hold_expires_at(self, obj):
+        hold = getattr(obj, 'seathold', None)
+        return hold.expires_at if hold and not hold.released else None
+
+    class Meta(BookingCardSerializer.Meta):
+        fields = BookingCardSerializer.Meta.fields + ['total_price', 'hold_expires_at']
+
+
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
@@ -139,5 +249,5 @@ class ReviewSerializer(serializers.ModelSerializer):
 
 
 class ServiceRevenueSerializer(serializers.Serializer):
-    service_name = serializers.CharField(source='service_schedule__service__name')
+    service_name = serializers.CharField()
     total_revenue = serializers.FloatField()
@@ -0,0 +1,185 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from oauth2_provider.models import get_access_token_model
+
+from travel import search, cache, authentication
+from travel.paginators import bump_count_version
+from travel.models import Service, Review, Booking, RevenueDaily, SeatHold, Image, Discount, ServiceType, Province, \
+    ServiceSchedule, User
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_cached_counts(sender, **kwargs):
+    if sender._meta.app_label == 'travel':
+        bump_count_version(sender)
+
+
+def _review_contribution(service_id, star, active):
+    # Một review chỉ được tính vào thống kê của service khi còn active
+    if service_id is None or not active:
+        return None
+    return service_id, star
+
+
+@receiver(pre_save, sender=Review)
+def review_pre_save(sender, instance, **kwargs):
+    instance._old_contribution = None
+    if instance.pk:
+        old = sender.objects.filter(pk=instance.pk).values('service_id', 'star', 'active').first()
+        if old:
+            instance._old_contribution = _review_contribution(old['service_id'], old['star'], old['active'])
+
+
+@receiver(post_save, sender=Review)
+def review_post_save(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_contribution', None)
+    new = _review_contribution(instance.service_id, instance.star, instance.active)
+    if old == new:
+        return
+
+    if old and new and old[0] == new[0]:
+        Service.apply_review_delta(new[0], 0, new[1] - old[1], {old[1]: -1, new[1]: 1})
+        return
+
+    if old:
+        Service.apply_review_delta(old[0], -1, -old[1], {old[1]: -1})
+    if new:
+        Service.apply_review_delta(new[0], 1, new[1], {new[1]: 1})
+
+
+@receiver(post_delete, sender=Review)
+def review_post_delete(sender, instance, **kwargs):
+    contribution = _review_contribution(instance.service_id, instance.star, instance.active)
+    if contribution:
+        Service.apply_review_delta(contribution[0], -1, -contribution[1], {contribution[1]: -1})
+
+
+@receiver(pre_save, sender=Booking)
+def booking_pre_save(sender, instance, **kwargs):
+    instance._old_revenue = None
+    instance._old_schedule_id = None
+    if instance.pk:
+        old = sender.objects.filter(pk=instance.pk).select_related('service_schedule__service').first()
+        if old:
+            instance._old_revenue = old.revenue_contribution()
+            instance._old_schedule_id = old.service_schedule_id
+
+
+@receiver(post_save, sender=Booking)
+def booking_post_save(sender, instance, created, **kwargs):
+    old = getattr(instance, '_old_revenue', None)
+    new = instance.revenue_contribution()
+    if old == new:
+        return
+
+    if new and not old:
+        # Đã thanh toán thì không còn giữ chỗ tạm nữa
+        SeatHold.objects.filter(booking=instance).delete()
+
+    RevenueDaily.apply(old, sign=-1)
+    RevenueDaily.apply(new)
+
+
+@receiver(post_delete, sender=Booking)
+def booking_post_delete(sender, instance, **kwargs):
+    if instance.payment_status:
+        service = Service.objects.filter(serviceschedule=instance.service_schedule_id) \
+            .values('id', 'provider_id').first()
+        if service:
+            RevenueDaily.apply(instance.revenue_contribution(service['id'], service['provider_id']), sign=-1)
+
+
+@receiver(post_save, sender=Service)
+def service_post_save(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) & set(search.SEARCH_FIELDS):
+        search.index_service(instance)
+
+
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+def invalidate_service_cache(sender, instance, **kwargs):
+    cache.invalidate('services', 'list', instance.pk)
+
+
+@receiver(post_save, sender=Image)
+@receiver(post_delete, sender=Image)
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_service_child_cache(sender, instance, **kwargs):
+    cache.invalidate('services', 'list', instance.service_id)
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_review_feed_cache(sender, instance, **kwargs):
+    cache.invalidate('reviews', instance.service_id)
+
+
+@receiver(post_save, sender=Discount)
+@receiver(post_delete, sender=Discount)
+def invalidate_discount_cache(sender, instance, **kwargs):
+    service_ids = Service.objects.filter(discount=instance.pk).values_list('id', flat=True)
+    cache.invalidate('services', 'list', *service_ids)
+
+
+@receiver(post_save, sender=ServiceType)
+@receiver(post_delete, sender=ServiceType)
+def invalidate_service_type_cache(sender, instance, **kwargs):
+    cache.invalidate('service-types', 'list', instance.pk)
+
+
+@receiver(post_save, sender=Province)
+@receiver(post_delete, sender=Province)
+def invalidate_province_cache(sender, instance, **kwargs):
+    cache.invalidate('provinces', 'list', instance.pk)
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_calendar(sender, instance, **kwargs):
+    schedule_ids = {instance.service_schedule_id, getattr(instance, '_old_schedule_id', None)} - {None}
+    cache.invalidate_calendar(ServiceSchedule.objects.filter(pk__in=schedule_ids).values_list('service_id', 'date'))
+
+
+@receiver(pre_save, sender=ServiceSchedule)
+def schedule_pre_save(sender, instance, **kwargs):
+    instance._old_calendar = None
+    if instance.pk:
+        instance._old_calendar = sender.objects.filter(pk=instance.pk).values_list('service_id', 'date').first()
+
+
+@receiver(post_save, sender=ServiceSchedule)
+@receiver(post_delete, sender=ServiceSchedule)
+def invalidate_schedule_calendar(sender, instance, **kwargs):
+    old = getattr(instance, '_old_calendar', None)
+    cache.invalidate_calendar([(instance.service_id, instance.date)] + ([old] if old else []))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def invalidate_booking_dashboard(sender, instance, **kwargs):
+    schedule_ids = {instance.service_schedule_id, getattr(instance, '_old_schedule_id', None)} - {None}
+    cache.invalidate_dashboard(Service.objects.filter(serviceschedule__in=schedule_ids)
+                               .values_list('provider_id', flat=True))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+@receiver(post_save, sender=ServiceSchedule)
+@receiver(post_delete, sender=ServiceSchedule)
+def invalidate_service_dashboard(sender, instance, **kwargs):
+    cache.invalidate_dashboard(Service.objects.filter(pk=instance.service_id).values_list('provider_id', flat=True))
+
+
+@receiver(post_save, sender=get_access_token_model())
+@receiver(post_delete, sender=get_access_token_model())
+def invalidate_access_token_cache(sender, instance, **kwargs):
+    # Token bị thu hồi (revoke xoá AccessToken) hoặc bị sửa thì không dùng bản cache nữa
+    authentication.invalidate_token(instance.token)
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_token_cache(sender, instance, **kwargs):
+    # Bản cache giữ cả user nên đổi thông tin user phải làm mới các token của user đó
+    authentication.invalidate_user_tokens(instance.pk)
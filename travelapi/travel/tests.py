@@ -1,3 +1,829 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from cloudinary import CloudinaryResource
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import Sum
+from django.conf import settings
+from django.utils import timezone
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from oauth2_provider.models import get_access_token_model, get_application_model
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from travel import paginators, payments, http, authentication, uploads, inventory
+from travel.authentication import CachedOAuth2Authentication
+from travel.cache import get_version
+from travel.models import User, Provider, Customer, ServiceType, Province, Discount, Service, ServiceSchedule, \
+    Image, Booking, Review, PaymentTransaction, RevenueDaily, UploadTask, SeatHold
+
+
+def create_fixture(services=1):
+    """Provider, customer, các service và một lịch trình 10 chỗ cho service đầu tiên."""
+    provider_user = User.objects.create(username='provider', CCCD='1', phone='1', address='HN')
+    provider = Provider.objects.create(name='Provider', user=provider_user)
+    customer_user = User.objects.create(username='customer', CCCD='2', phone='0909', address='HN')
+    customer = Customer.objects.create(full_name='Customer', birthday='2000-01-01', gender='m', user=customer_user)
+    service_type = ServiceType.objects.create(name='Tour')
+    province = Province.objects.create(name='Quảng Ninh')
+    discount = Discount.objects.create(discount=10)
+    created = [Service.objects.create(name=f'Tour Hạ Long {i}', address='Quảng Ninh', price=100 + i,
+                                      service_type=service_type, provider=provider, province=province,
+                                      discount=discount)
+               for i in range(services)]
+    schedule = ServiceSchedule.objects.create(date=date.today() + timedelta(days=3), max_participants=10,
+                                              start_time='08:00', end_time='17:00', service=created[0])
+
+    return provider, customer, created, schedule
+
+
+class ServiceListQueryCountTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, _, self.services, _ = create_fixture(services=10)
+        for service in self.services:
+            Image.objects.create(service=service,
+                                 path=CloudinaryResource('sample', type='upload', resource_type='image'))
+        self.client = APIClient()
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=None)
+    def test_query_count_does_not_grow_with_page_size(self):
+        # COUNT, danh sách service (JOIN discount) và một truy vấn ảnh cho cả trang; tắt số dòng ước lượng
+        # để MySQL/PostgreSQL không đọc thêm thống kê bảng khi cache trống
+        for page_size in (4, 8):
+            cache.clear()
+            with mock.patch.object(paginators.ServicePaginator, 'page_size', page_size):
+                with self.assertNumQueries(3):
+                    response = self.client.get('/services/')
+
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), page_size)
+
+
+class CachedCountPaginatorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        create_fixture(services=3)
+
+    def count(self, queryset):
+        return paginators.CachedCountPaginator(queryset, 2).count
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=10)
+    def test_large_unfiltered_table_uses_cached_estimate(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch.object(connection, 'cursor') as cursor:
+            cursor.return_value.__enter__.return_value.fetchone.return_value = (500,)
+            self.assertEqual(self.count(Service.objects.all()), 500)
+            paginators.bump_count_version(Service)
+            self.assertEqual(self.count(Service.objects.all()), 500)
+
+        # Thống kê bảng chỉ được đọc một lần
+        self.assertEqual(cursor.call_count, 1)
+
+    @override_settings(PAGINATION_COUNT_ESTIMATE_THRESHOLD=10)
+    def test_filtered_queryset_is_counted_exactly(self):
+        # Chỉ một câu COUNT, không đọc thống kê bảng
+        with mock.patch.object(connection, 'vendor', 'postgresql'), self.assertNumQueries(1):
+            self.assertEqual(self.count(Service.objects.filter(price__gt=100)), 2)
+
+
+class ServiceSearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, _, self.services, _ = create_fixture(services=2)
+        self.services[1].name = 'Khám phá Sapa'
+        self.services[1].save()
+        self.client = APIClient()
+
+    def test_query_matches_token_prefix_regardless_of_case_and_accents(self):
+        response = self.client.get('/services/', {'q': 'HẠ LON'})
+        self.assertEqual([service['id'] for service in response.data['results']], [self.services[0].pk])
+
+        response = self.client.get('/services/', {'q': 'kham'})
+        self.assertEqual([service['id'] for service in response.data['results']], [self.services[1].pk])
+
+
+class MonthlyRevenueTest(TestCase):
+    def setUp(self):
+        self.provider, _, _, _ = create_fixture()
+        self.client = APIClient()
+
+    def test_out_of_range_month_is_rejected(self):
+        for month in (0, 13):
+            response = self.client.get(f'/revenue/{self.provider.pk}/monthly-revenue/?month={month}&year=2024')
+            self.assertEqual(response.status_code, 400)
+
+    def test_valid_month_without_revenue_is_empty(self):
+        response = self.client.get(f'/revenue/{self.provider.pk}/monthly-revenue/?month=12&year=2024')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+
+class RevenueDailyTest(TestCase):
+    def setUp(self):
+        self.provider, self.customer, services, self.schedule = create_fixture(services=2)
+        self.other_schedule = ServiceSchedule.objects.create(date=self.schedule.date, max_participants=10,
+                                                             start_time='08:00', end_time='17:00',
+                                                             service=services[1])
+
+    def book(self, quantity=1, paid=True):
+        return Booking.objects.create(customer=self.customer, service_schedule=self.schedule, quantity=quantity,
+                                      total_price=100 * quantity, payment_status=paid)
+
+    @staticmethod
+    def rows():
+        return sorted(RevenueDaily.objects.filter(bookings__gt=0)
+                      .values_list('provider', 'service', 'date', 'bookings', 'quantity', 'revenue'))
+
+    def assertMatchesRebuild(self):
+        incremental = self.rows()
+        RevenueDaily.rebuild()
+        self.assertEqual(incremental, self.rows())
+        return incremental
+
+    def test_create_counts_only_paid_bookings(self):
+        self.book(2)
+        self.book(5, paid=False)
+
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([row[3:] for row in rows], [(1, 2, 200)])
+
+    def test_update_payment_and_quantity(self):
+        booking = self.book(2, paid=False)
+        booking.payment_status = True
+        booking.save()
+        self.assertMatchesRebuild()
+
+        booking.quantity, booking.total_price = 3, 300
+        booking.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([row[3:] for row in rows], [(1, 3, 300)])
+
+    def test_booking_moved_to_another_date_and_service(self):
+        booking = self.book(2)
+        self.book(1)
+
+        booking.created_date -= timedelta(days=3)
+        booking.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual(len({row[2] for row in rows}), 2)
+
+        booking.service_schedule = self.other_schedule
+        booking.save()
+        rows = self.assertMatchesRebuild()
+        self.assertEqual(len({row[1] for row in rows}), 2)
+
+    def test_delete_removes_contribution(self):
+        booking = self.book(2)
+        self.book(1)
+
+        booking.delete()
+
+        rows = self.assertMatchesRebuild()
+        self.assertEqual([row[3:] for row in rows], [(1, 1, 100)])
+
+
+def index_name(model, fields):
+    return next(index.name for index in model._meta.indexes if index.fields == fields)
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class HotPathIndexTest(TestCase):
+    """Kế hoạch truy vấn của các đường truy cập chính phải dùng index ghép đã thêm."""
+
+    def setUp(self):
+        _, self.customer, services, self.schedule = create_fixture()
+        self.service = services[0]
+
+    def assertUsesIndex(self, queryset, model, fields):
+        plan = queryset.explain()
+        self.assertIn(index_name(model, fields), plan, msg=plan)
+
+    def test_customer_bookings(self):
+        self.assertUsesIndex(Booking.objects.filter(customer=self.customer, payment_status=False, active=True),
+                             Booking, ['customer', 'payment_status', 'active'])
+
+    def test_service_schedules_by_date(self):
+        self.assertUsesIndex(ServiceSchedule.objects.filter(service=self.service, date__gte=date.today())
+                             .order_by('date'), ServiceSchedule, ['service', 'date'])
+
+    def test_service_reviews_newest_first(self):
+        self.assertUsesIndex(Review.objects.filter(service=self.service).order_by('-created_date'),
+                             Review, ['service', '-created_date'])
+
+    def test_services_by_province_and_price(self):
+        self.assertUsesIndex(Service.objects.filter(province=self.service.province_id).order_by('price'),
+                             Service, ['province', 'price'])
+        self.assertUsesIndex(Service.objects.filter(service_type=self.service.service_type_id).order_by('price'),
+                             Service, ['service_type', 'price'])
+
+
+class BookingSeatTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, self.customer, _, self.schedule = create_fixture()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+
+    def book(self, quantity, **extra):
+        return self.client.post('/bookings/', {'quantity': quantity, 'total_price': 100 * quantity,
+                                               'customer': self.customer.pk,
+                                               'service_schedule': self.schedule.pk, **extra}, format='json')
+
+    def test_active_booking_reserves_seats(self):
+        self.assertEqual(self.book(3).status_code, 201)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available, 7)
+
+    def test_inactive_booking_reserves_nothing(self):
+        self.assertEqual(self.book(2, active=False).status_code, 201)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available, 10)
+
+    def test_overbooking_is_rejected(self):
+        self.assertEqual(self.book(11).status_code, 409)
+
+    def test_expired_hold_returns_seats_once(self):
+        expired = Booking.objects.get(pk=self.book(3).data['id'])
+        live = Booking.objects.get(pk=self.book(2).data['id'])
+        SeatHold.objects.filter(booking=expired).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(inventory.release_expired_holds(), 1)
+        self.assertEqual(inventory.release_expired_holds(), 0)
+
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available, 8)
+        expired.refresh_from_db()
+        live.refresh_from_db()
+        self.assertEqual((expired.active, live.active), (False, True))
+        self.assertTrue(SeatHold.objects.get(booking=expired).released)
+        self.assertFalse(SeatHold.objects.get(booking=live).released)
+
+    def resize(self, max_participants):
+        return self.client.patch(f'/service-schedules/{self.schedule.pk}/',
+                                 {'max_participants': max_participants, 'available': 100}, format='json')
+
+    def test_raising_capacity_adds_seats(self):
+        self.book(2)
+        self.assertEqual(self.resize(20).status_code, 200)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available, 18)
+
+    def test_lowering_capacity_removes_seats(self):
+        self.book(2)
+        self.assertEqual(self.resize(5).status_code, 200)
+        self.schedule.refresh_from_db()
+        self.assertEqual(self.schedule.available, 3)
+
+    def test_capacity_below_booked_is_rejected(self):
+        self.book(2)
+        self.assertEqual(self.resize(1).status_code, 400)
+        self.schedule.refresh_from_db()
+        self.assertEqual((self.schedule.max_participants, self.schedule.available), (10, 8))
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    """Nhiều request đặt chỗ đồng thời vào cùng một lịch trình không được bán quá số chỗ."""
+    threads = 20
+
+    def setUp(self):
+        cache.clear()
+        _, self.customer, _, self.schedule = create_fixture()
+
+    def test_parallel_bookings_do_not_oversell(self):
+        barrier = threading.Barrier(self.threads)
+        results = []
+
+        def book():
+            # Exception của request được báo qua signal chung cho mọi client, nên để client trả 500 thay vì raise
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(self.customer.user)
+            barrier.wait()
+            try:
+                # SQLite khoá cả bảng khi có ghi đồng thời nên thử lại, MySQL thì tự chờ khoá dòng
+                for _ in range(200):
+                    response = client.post('/bookings/', {'quantity': 1, 'total_price': 100,
+                                                          'customer': self.customer.pk,
+                                                          'service_schedule': self.schedule.pk}, format='json')
+                    if response.status_code != 500:
+                        break
+                    time.sleep(0.01)
+                results.append(response.status_code)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=book) for _ in range(self.threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.schedule.refresh_from_db()
+        booked = Booking.objects.filter(service_schedule=self.schedule, active=True) \
+            .aggregate(total=Sum('quantity'))['total'] or 0
+        self.assertEqual(len(results), self.threads)
+        self.assertNotIn(500, results)
+        self.assertIn(201, results)
+        self.assertEqual(results.count(201), booked)
+        self.assertGreaterEqual(self.schedule.available, 0)
+        self.assertLessEqual(booked, self.schedule.max_participants)
+        self.assertEqual(self.schedule.available, self.schedule.max_participants - booked)
+
+
+class StubGatewayHandler(BaseHTTPRequestHandler):
+    """Cổng thanh toán giả: trả `payload` sau `delay` giây và đếm số request nhận được."""
+    protocol_version = 'HTTP/1.1'
+    payload = {}
+    delay = 0
+    hits = 0
+
+    def do_POST(self):
+        type(self).hits += 1
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(self.delay)
+        body = json.dumps(self.payload).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client đã bỏ đi vì timeout
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class PaymentGatewayTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGatewayHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        endpoint = f'http://127.0.0.1:{cls.server.server_port}/'
+        providers = {name: {**config, 'endpoint': endpoint} for name, config in settings.PAYMENT_PROVIDERS.items()}
+        cls.settings_override = override_settings(PAYMENT_PROVIDERS=providers, PAYMENT_HTTP_RETRIES=2,
+                                                  PAYMENT_HTTP_RETRY_BACKOFF=0,
+                                                  HTTP_HOST_TIMEOUTS={'127.0.0.1': 0.2})
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _, customer, _, schedule = create_fixture()
+        self.booking = Booking.objects.create(customer=customer, service_schedule=schedule, quantity=1,
+                                              total_price=100000)
+        StubGatewayHandler.delay = 0
+        StubGatewayHandler.hits = 0
+
+    def pay(self, url):
+        return self.client.post(url, HTTP_BOOKING_ID=str(self.booking.pk))
+
+    def test_momo_success(self):
+        StubGatewayHandler.payload = {'resultCode': 0, 'payUrl': 'https://pay.example/1'}
+        data = self.pay('/payment/').json()
+
+        payment = PaymentTransaction.objects.get(booking=self.booking)
+        self.assertEqual(data['payUrl'], 'https://pay.example/1')
+        self.assertEqual(data['order_id'], payment.order_id)
+        self.assertEqual(payment.status, PaymentTransaction.PENDING)
+        self.assertEqual(StubGatewayHandler.hits, 1)
+
+    def test_zalopay_rejection_marks_payment_failed(self):
+        StubGatewayHandler.payload = {'return_code': 2, 'return_message': 'fail'}
+        data = self.pay('/zalo/payment/').json()
+
+        self.assertEqual(data['return_code'], 2)
+        self.assertEqual(PaymentTransaction.objects.get(booking=self.booking).status, PaymentTransaction.FAILED)
+
+    def test_timeout_is_retried_then_reported(self):
+        # Cổng trả lời chậm hơn timeout đọc 0.2s: thử lại PAYMENT_HTTP_RETRIES lần rồi trả về lỗi
+        StubGatewayHandler.payload = {'resultCode': 0}
+        StubGatewayHandler.delay = 0.5
+        for url in ('/payment/', '/zalo/payment/'):
+            StubGatewayHandler.hits = 0
+            response = self.pay(url)
+
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('error', response.json())
+            self.assertEqual(StubGatewayHandler.hits, 3)
+
+        # Giao dịch vẫn chờ và chưa lưu phản hồi, gửi lại cùng Idempotency-Key sẽ gọi cổng lần nữa
+        self.assertFalse(PaymentTransaction.objects.filter(booking=self.booking).exclude(
+            status=PaymentTransaction.PENDING).exists())
+        self.assertFalse(PaymentTransaction.objects.filter(booking=self.booking, response__isnull=False).exists())
+
+    def test_async_client_is_shared_within_loop(self):
+        async def get_clients():
+            clients = [http.get_async_client(), http.get_async_client()]
+            await http.aclose_async_client()
+            return clients
+
+        first, second = async_to_sync(get_clients)()
+        self.assertIs(first, second)
+        self.assertTrue(first.is_closed)
+
+    def test_wsgi_request_closes_async_client(self):
+        StubGatewayHandler.payload = {'resultCode': 0}
+        clients = []
+        get_async_client = http.get_async_client
+
+        def capture():
+            clients.append(get_async_client())
+            return clients[-1]
+
+        with mock.patch.object(http, 'get_async_client', capture):
+            self.pay('/payment/')
+
+        self.assertEqual(len(clients), 1)
+        self.assertTrue(clients[0].is_closed)
+
+    def test_invalid_booking_id_is_rejected(self):
+        response = self.client.post('/payment/', HTTP_BOOKING_ID='abc')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(StubGatewayHandler.hits, 0)
+
+    def test_idempotency_key_returns_same_payment(self):
+        StubGatewayHandler.payload = {'resultCode': 0, 'payUrl': 'https://pay.example/1'}
+        first = self.client.post('/payment/', HTTP_BOOKING_ID=str(self.booking.pk), HTTP_IDEMPOTENCY_KEY='k1')
+        second = self.client.post('/payment/', HTTP_BOOKING_ID=str(self.booking.pk), HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual(first.json()['order_id'], second.json()['order_id'])
+        self.assertEqual(PaymentTransaction.objects.filter(booking=self.booking).count(), 1)
+        self.assertEqual(StubGatewayHandler.hits, 1)
+
+    def test_idempotency_key_of_another_booking_is_rejected(self):
+        StubGatewayHandler.payload = {'resultCode': 0}
+        self.client.post('/payment/', HTTP_BOOKING_ID=str(self.booking.pk), HTTP_IDEMPOTENCY_KEY='k1')
+        other = Booking.objects.create(customer=self.booking.customer, service_schedule=self.booking.service_schedule,
+                                       quantity=1, total_price=100000)
+
+        response = self.client.post('/payment/', HTTP_BOOKING_ID=str(other.pk), HTTP_IDEMPOTENCY_KEY='k1')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(PaymentTransaction.objects.filter(booking=other).exists())
+
+    def test_booking_with_payment_cannot_be_deleted(self):
+        StubGatewayHandler.payload = {'resultCode': 0}
+        self.pay('/payment/')
+        client = APIClient()
+        client.force_authenticate(self.booking.customer.user)
+
+        response = client.delete(f'/bookings/{self.booking.pk}/')
+
+        self.assertEqual(response.status_code, 409)
+        self.assertTrue(Booking.objects.filter(pk=self.booking.pk).exists())
+
+
+class PaymentCallbackTest(TestCase):
+    def setUp(self):
+        _, customer, _, schedule = create_fixture()
+        self.booking = Booking.objects.create(customer=customer, service_schedule=schedule, quantity=1,
+                                              total_price=100000)
+        self.payment = PaymentTransaction.objects.create(booking=self.booking, provider='momo', order_id='MOMO1',
+                                                         idempotency_key='k1', amount=100000)
+
+    def ipn(self, amount=100000, secret=None):
+        config = settings.PAYMENT_PROVIDERS['momo']
+        data = {'amount': amount, 'orderId': 'MOMO1', 'partnerCode': config['partner_code'], 'resultCode': 0,
+                'transId': 42}
+        fields = '&'.join(f"{f}={data.get(f, '')}" for f in payments.MoMoProvider.IPN_FIELDS)
+        raw = f"accessKey={config['access_key']}&{fields}"
+        data['signature'] = payments.sign(secret or config['secret_key'], raw)
+        return self.client.post('/payment/momo/ipn/', data, content_type='application/json')
+
+    def assertPaymentStatus(self, payment_status, booking_paid):
+        self.payment.refresh_from_db()
+        self.booking.refresh_from_db()
+        self.assertEqual((self.payment.status, self.booking.payment_status), (payment_status, booking_paid))
+
+    def test_invalid_signature_is_rejected(self):
+        self.assertEqual(self.ipn(secret='wrong').status_code, 400)
+        self.assertPaymentStatus(PaymentTransaction.PENDING, False)
+
+    def test_amount_mismatch_is_rejected(self):
+        self.assertEqual(self.ipn(amount=1000).status_code, 400)
+        self.assertPaymentStatus(PaymentTransaction.PENDING, False)
+
+    def test_replayed_ipn_is_applied_once(self):
+        for _ in range(2):
+            self.assertEqual(self.ipn().status_code, 204)
+
+        self.assertPaymentStatus(PaymentTransaction.PAID, True)
+        self.assertEqual(self.payment.provider_ref, '42')
+        self.assertEqual(RevenueDaily.objects.get().bookings, 1)
+
+
+class ImageVariantTest(TestCase):
+    def setUp(self):
+        self.provider, _, services, _ = create_fixture()
+        self.service = services[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider.user)
+
+    def test_public_id_string_gets_variants(self):
+        image = Image.objects.create(service=self.service, path='sample.jpg')
+        self.assertEqual(set(image.path_urls), {'thumb', 'card', 'full'})
+        self.assertIn('c_fill', image.url('thumb'))
+
+    @mock.patch('cloudinary.uploader.upload_resource')
+    def test_uploaded_file_gets_variants_after_upload(self, upload_resource):
+        # CloudinaryField.pre_save upload file trong lúc save, URL chỉ dựng được sau đó
+        upload_resource.return_value = CloudinaryResource('uploaded', format='png', type='upload',
+                                                          resource_type='image')
+        image = Image.objects.create(service=self.service, path='sample.jpg')
+
+        response = self.client.patch(f'/images/{image.pk}/', {'path': SimpleUploadedFile('a.png', b'png')},
+                                     format='multipart')
+
+        self.assertEqual(response.status_code, 200)
+        image.refresh_from_db()
+        self.assertIn('uploaded', image.path_urls['thumb'])
+        self.assertIn('uploaded', response.data['path'])
+
+
+class UploadQueueTest(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = override_settings(UPLOAD_STORAGE_BACKEND='travel.uploads.LocalFakeStorage',
+                                     UPLOAD_STAGING_DIR=os.path.join(directory.name, 'staging'),
+                                     MEDIA_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.provider, _, services, _ = create_fixture()
+        self.service = services[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider.user)
+
+    def upload(self):
+        # Worker chỉ được giao task sau khi transaction commit; test tự chạy task thay cho worker
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post('/images/', {'service': self.service.pk,
+                                                     'path': SimpleUploadedFile('a.png', b'png')},
+                                        format='multipart')
+        self.assertEqual(len(callbacks), 1)
+        return response, UploadTask.objects.get()
+
+    def test_upload_completes_in_background(self):
+        response, task = self.upload()
+
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['upload_status'], 'pending')
+        self.assertTrue(os.path.exists(task.staged_path))
+
+        uploads.process(task.pk)
+
+        response = self.client.get(f"/images/{response.data['id']}/")
+        self.assertEqual(response.data['upload_status'], 'done')
+        self.assertIn('fake-uploads', response.data['path'])
+        self.assertFalse(UploadTask.objects.exists())
+        self.assertFalse(os.path.exists(task.staged_path))
+
+    def test_failed_upload_is_recorded(self):
+        _, task = self.upload()
+
+        with mock.patch.object(uploads.LocalFakeStorage, 'upload', side_effect=OSError('storage down')):
+            uploads.process(task.pk)
+
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts, task.error), (UploadTask.FAILED, 1, 'storage down'))
+        # File tạm được giữ lại để retry_stale thử lại
+        self.assertTrue(os.path.exists(task.staged_path))
+        self.assertFalse(Image.objects.get(pk=task.object_id).path)
+
+
+class ScheduleRosterTest(TransactionTestCase):
+    def setUp(self):
+        _, self.customer, _, self.schedule = create_fixture()
+        for _ in range(3):
+            Booking.objects.create(customer=self.customer, service_schedule=self.schedule, quantity=1,
+                                   total_price=100)
+        self.url = f'/customers-by-schedule/{self.schedule.pk}/'
+
+    def test_plain_list_is_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(self.url)
+        self.assertEqual([row['full_name'] for row in response.json()], ['Customer'] * 3)
+
+    def test_wsgi_streams_with_sync_iterator(self):
+        response = self.client.get(self.url + '?stream=true')
+        self.assertFalse(response.is_async)
+        self.assertEqual(len(json.loads(b''.join(response.streaming_content))), 3)
+
+    async def test_asgi_streams_with_async_iterator(self):
+        client = AsyncClient()
+        response = await client.get(self.url + '?stream=true')
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(len(json.loads(content)), 3)
+
+        response = await client.get(self.url + '?format=csv')
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(content.splitlines()[0], '\ufefffull_name,phone,address,avatar')
+        self.assertEqual(len(content.splitlines()), 4)
+
+
+class ServiceReviewFeedTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, self.customer, services, _ = create_fixture()
+        self.service = services[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+        self.url = f'/reviews/service-reviews/?service_id={self.service.pk}'
+
+    def create_reviews(self, count, content='<p>Tốt</p>'):
+        return [Review.objects.create(customer=self.customer, service=self.service, star=5, content=content)
+                for _ in range(count)]
+
+    def test_cursor_pages_walk_every_review(self):
+        reviews = self.create_reviews(12)
+        seen = []
+        url = self.url + '&cursor='
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [review['review_id'] for review in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, sorted((review.pk for review in reviews), reverse=True))
+
+    def test_cursor_keeps_microseconds(self):
+        # Các review cùng một mili giây, chỉ khác micro giây
+        reviews = self.create_reviews(6)
+        created = timezone.now().replace(microsecond=123000)
+        for i, review in enumerate(reviews):
+            Review.objects.filter(pk=review.pk).update(created_date=created + timedelta(microseconds=i * 100))
+
+        seen = []
+        url = self.url + '&cursor=&page_size=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [review['review_id'] for review in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, [review.pk for review in reversed(reviews)])
+
+    @override_settings(REVIEW_EXCERPT_LENGTH=20)
+    def test_excerpt_strips_markup_before_truncating(self):
+        self.create_reviews(1, content='<p><strong class="highlight">Rất</strong> tuyệt vời</p>' * 10)
+        self.create_reviews(1, content='<p><em>Tốt</em></p>')
+
+        response = self.client.get(self.url + '&excerpt=true')
+
+        self.assertEqual(response.status_code, 200)
+        short, long = response.data['results']
+        self.assertEqual(short['content'], 'Tốt')
+        self.assertFalse(short['truncated'])
+        self.assertNotIn('<', long['content'])
+        self.assertEqual(len(long['content']), 20)
+        self.assertTrue(long['content'].startswith('Rất tuyệt vờiRất'))
+        self.assertTrue(long['truncated'])
+
+
+class ScheduleCalendarTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        _, self.customer, services, self.schedule = create_fixture()
+        self.client = APIClient()
+        self.client.force_authenticate(self.customer.user)
+        day = self.schedule.date
+        self.url = f'/service-schedules/calendar/?service={services[0].pk}&start={day}&end={day + timedelta(days=40)}'
+
+    def calendar(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [(row['date'], row['capacity'], row['booked']) for row in response.data]
+
+    def test_cached_calendar_skips_database(self):
+        self.calendar()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.calendar(), [(self.schedule.date, 10, 0)])
+
+    def test_booking_change_invalidates_calendar(self):
+        self.calendar()
+        booking = Booking.objects.create(customer=self.customer, service_schedule=self.schedule, quantity=3,
+                                         total_price=300)
+        self.assertEqual(self.calendar(), [(self.schedule.date, 10, 3)])
+
+        booking.delete()
+        self.assertEqual(self.calendar(), [(self.schedule.date, 10, 0)])
+
+    def test_schedule_change_invalidates_calendar(self):
+        self.calendar()
+        self.schedule.max_participants = 20
+        self.schedule.save()
+        self.assertEqual(self.calendar(), [(self.schedule.date, 20, 0)])
+
+        # Dời sang tháng sau: cả tháng cũ lẫn tháng mới đều phải tính lại
+        old_date = self.schedule.date
+        self.schedule.date = old_date + timedelta(days=35)
+        self.schedule.save()
+        self.assertEqual(self.calendar(), [(old_date + timedelta(days=35), 20, 0)])
+
+
+class BulkGenerateScheduleTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.provider, self.customer, services, _ = create_fixture()
+        self.service = services[0]
+        self.client = APIClient()
+        self.client.force_authenticate(self.provider.user)
+        self.start = date.today() + timedelta(days=10)
+
+    def generate(self, times=(('08:00', '12:00'),)):
+        return self.client.post('/service-schedules/bulk-generate/', {
+            'service': self.service.pk, 'start_date': self.start, 'end_date': self.start + timedelta(days=2),
+            'times': [{'start_time': start, 'end_time': end} for start, end in times], 'max_participants': 5,
+        }, format='json')
+
+    def test_duplicate_times_create_one_schedule_per_slot(self):
+        response = self.generate(times=(('08:00', '12:00'), ('08:00', '12:00'), ('13:00', '17:00')))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 6)
+        self.assertEqual(ServiceSchedule.objects.filter(service=self.service, date__gte=self.start).count(), 6)
+
+    def test_other_provider_cannot_generate(self):
+        self.client.force_authenticate(self.customer.user)
+
+        self.assertEqual(self.generate().status_code, 403)
+        self.assertFalse(ServiceSchedule.objects.filter(service=self.service, date__gte=self.start).exists())
+
+    def test_bulk_generate_invalidates_provider_dashboard(self):
+        version = get_version('dashboard', self.provider.pk)
+
+        response = self.generate()
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data['created']), 3)
+        self.assertGreater(get_version('dashboard', self.provider.pk), version)
+
+
+class CachedOAuth2AuthenticationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='customer', CCCD='2', phone='0909', address='HN')
+        application = get_application_model().objects.create(
+            name='app', user=self.user, client_type='confidential', authorization_grant_type='password')
+        self.token = get_access_token_model().objects.create(
+            user=self.user, application=application, token='token', scope='read write',
+            expires=timezone.now() + timedelta(hours=1))
+
+    def authenticate(self):
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Bearer token')
+        return CachedOAuth2Authentication().authenticate(Request(request))
+
+    def test_cached_token_skips_database(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, token = self.authenticate()
+
+        self.assertEqual((user, token), (self.user, self.token))
+
+    def test_cache_ttl_is_capped_by_token_lifetime(self):
+        get_access_token_model().objects.filter(pk=self.token.pk).update(
+            expires=timezone.now() + timedelta(seconds=30))
+        token_cache = authentication.get_token_cache()
+        with mock.patch.object(token_cache, 'set', wraps=token_cache.set) as cache_set:
+            self.authenticate()
+
+        self.assertLessEqual(cache_set.call_args.args[2], 30)
+
+    def test_expired_cached_token_is_rejected(self):
+        self.authenticate()
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(hours=2)):
+            self.assertIsNone(self.authenticate())
+
+    def test_revoked_token_is_rejected(self):
+        self.authenticate()
+        self.token.revoke()
+        self.assertIsNone(self.authenticate())
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate()
@@ -0,0 +1,129 @@
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from cloudinary import CloudinaryResource, uploader
+from django.apps import apps
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction, close_old_connections
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from travel.models import UploadTask
+
+
+class CloudinaryStorage:
+    def upload(self, path):
+        return uploader.upload_resource(path, type='upload', resource_type='image')
+
+
+class LocalFakeStorage:
+    """Lưu file vào MEDIA_ROOT thay vì Cloudinary, dùng khi phát triển và kiểm thử."""
+
+    def upload(self, path):
+        directory = os.path.join(settings.MEDIA_ROOT, 'fake-uploads')
+        os.makedirs(directory, exist_ok=True)
+        name = os.path.basename(path)
+        shutil.copyfile(path, os.path.join(directory, name))
+        public_id, _, extension = name.rpartition('.')
+        return CloudinaryResource(public_id=f'fake-uploads/{public_id or name}', format=extension or None,
+                                  type='upload', resource_type='image')
+
+
+def get_storage():
+    return import_string(getattr(settings, 'UPLOAD_STORAGE_BACKEND', 'travel.uploads.CloudinaryStorage'))()
+
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=getattr(settings, 'UPLOAD_WORKERS', 4),
+                                       thread_name_prefix='upload')
+    return _executor
+
+
+def stage(file):
+    directory = getattr(settings, 'UPLOAD_STAGING_DIR')
+    os.makedirs(directory, exist_ok=True)
+    _, extension = os.path.splitext(file.name)
+    path = os.path.join(directory, f'{uuid.uuid4().hex}{extension.lower()}')
+    with open(path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+
+    return path
+
+
+def enqueue(instance, field, file):
+    # Ghi file ra đĩa rồi trả lời ngay, việc đẩy lên storage do worker làm sau khi transaction commit
+    task = UploadTask.objects.create(model=instance._meta.label_lower, object_id=instance.pk, field=field,
+                                     staged_path=stage(file))
+    transaction.on_commit(lambda: get_executor().submit(run_task, task.pk))
+    return task
+
+
+def save_deferred(serializer, field, **kwargs):
+    """serializer.save() nhưng file ở `field` được upload ở nền; trả về (instance, có đang chờ upload không)."""
+    file = serializer.validated_data.get(field)
+    if not isinstance(file, UploadedFile):
+        return serializer.save(**kwargs), False
+
+    serializer.validated_data.pop(field)
+    with transaction.atomic():
+        instance = serializer.save(**kwargs)
+        enqueue(instance, field, file)
+
+    return instance, True
+
+
+def process(task_id):
+    # Chỉ một worker nhận được task nhờ UPDATE có điều kiện
+    claimed = UploadTask.objects.filter(pk=task_id, status__in=[UploadTask.PENDING, UploadTask.FAILED]) \
+        .update(status=UploadTask.PROCESSING, attempts=F('attempts') + 1, updated_date=timezone.now())
+    if not claimed:
+        return
+
+    task = UploadTask.objects.get(pk=task_id)
+    try:
+        resource = get_storage().upload(task.staged_path)
+        instance = apps.get_model(task.model).objects.filter(pk=task.object_id).first()
+        if instance is not None:
+            setattr(instance, task.field, resource)
+            instance.save(update_fields=[task.field])
+    except Exception as e:
+        UploadTask.objects.filter(pk=task.pk).update(status=UploadTask.FAILED, error=str(e)[:1000],
+                                                     updated_date=timezone.now())
+        return
+
+    task.delete()
+    if os.path.exists(task.staged_path):
+        os.remove(task.staged_path)
+
+
+def run_task(task_id):
+    try:
+        process(task_id)
+    finally:
+        close_old_connections()
+
+
+def retry_stale(max_attempts=3, stale_after=timedelta(minutes=10)):
+    """Xử lý lại các task bị bỏ dở (worker chết giữa chừng) hoặc lỗi chưa quá số lần thử."""
+    stale = timezone.now() - stale_after
+    UploadTask.objects.filter(status__in=[UploadTask.PENDING, UploadTask.PROCESSING], updated_date__lt=stale) \
+        .update(status=UploadTask.PENDING)
+
+    task_ids = list(UploadTask.objects.filter(status__in=[UploadTask.PENDING, UploadTask.FAILED],
+                                              attempts__lt=max_attempts, updated_date__lt=stale)
+                    .values_list('id', flat=True))
+    for task_id in task_ids:
+        process(task_id)
+
+    return len(task_ids)
@@ -25,5 +25,8 @@ urlpatterns = [
     path('admin/', admin.site.urls),
     path('payment/', views.payment_view, name='payment'),
     path('zalo/payment/', views.create_payment, name='zalopay'),
+    path('payment/momo/ipn/', views.momo_ipn, name='momo-ipn'),
+    path('zalo/callback/', views.zalopay_callback, name='zalopay-callback'),
+    path('http-stats/', views.http_stats, name='http-stats'),
     path('customers-by-schedule/<int:schedule_id>/', get_customers_by_schedule, name='customers-by-schedule'),
 ]
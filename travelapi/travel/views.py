@@ -1,40 +1,29 @@
-import hashlib
-import urllib
-
-from django.contrib.auth import authenticate, login
-from django.contrib.auth.hashers import check_password, make_password
-from django.core.mail import EmailMessage
-from django.db.models import Avg, Count
-from django.shortcuts import render, get_object_or_404
-from django.http import HttpResponse, HttpRequest, JsonResponse
-from django.template.response import TemplateResponse
-from django.views import View
-from rest_framework import viewsets, generics, status, parsers, permissions
+from django.db import transaction
+from django.db.models import Sum, ProtectedError
+from django.db.models.functions import TruncMonth
+from django.shortcuts import get_object_or_404
+from django.http import HttpRequest, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
+from rest_framework import viewsets, generics, status, permissions
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
 from django.utils import timezone
 from rest_framework.parsers import JSONParser, MultiPartParser
 
-import time
-from datetime import datetime
-import json
-import requests
-import hmac
-import random
+from datetime import date, timedelta
 from django.views.decorators.csrf import csrf_exempt
 
-from travelapi import settings
+from django.conf import settings
 from travel.models import Role, User, Provider, Customer, ServiceType, Province, Image, Service, Discount, \
-    ServiceSchedule, Booking, Review
-from travel import serializers, paginators
-from travel.serializers import RoleSerializer, ProviderSerializer, CustomerSerializer, ServiceTypeSerializer, \
-    ProvinceSerializer, ImageSerializer, ServiceSerializer, DiscountSerializer, ServiceScheduleSerializer, \
-    BookingSerializer, ReviewSerializer, ServiceRevenueSerializer
+    ServiceSchedule, Booking, Review, RevenueDaily
+from travel import serializers, paginators, search, inventory, cache, payments, http, uploads, images, rosters, hashers
+from travel.cache import CachedResponseMixin
+from travel.serializers import ReviewSerializer, ServiceRevenueSerializer
 
 
-class RoleViewSet(viewsets.ModelViewSet):  #ModelViewSet: lấy tất cả các action CRUD
+class RoleViewSet(viewsets.ModelViewSet):  # ModelViewSet: lấy tất cả các action CRUD
     queryset = Role.objects.all()
     serializer_class = serializers.RoleSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -51,17 +40,21 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
 
         return [permissions.AllowAny()]
 
+    def perform_create(self, serializer):
+        # Ảnh đại diện được upload lên Cloudinary ở nền, không giữ request chờ
+        uploads.save_deferred(serializer, 'avatar')
+
     @action(methods=['get', 'patch'], url_path='current-user', detail=False)
     def current_user(self, request):
         user = request.user
         if request.method.__eq__('PATCH'):
             data = request.data.copy()  # Tạo một bản sao của dữ liệu để tránh ảnh hưởng đến dữ liệu gốc
             if 'password' in data:
-                data['password'] = make_password(data['password'])  # Băm mật khẩu
+                data['password'] = hashers.make_password(data['password'])  # Băm mật khẩu
 
             serializer = serializers.UserSerializer(instance=user, data=data, partial=True)
             if serializer.is_valid():
-                serializer.save()
+                uploads.save_deferred(serializer, 'avatar')
                 return Response(serializer.data)
             else:
                 return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -75,11 +68,11 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView):
         new_password = request.data.get('newPassword')
 
         # Kiểm tra xem mật khẩu cũ có đúng không
-        if not check_password(old_password, user.password):
+        if not hashers.verify_password(user, old_password, rehash=False):
             return Response({"detail": "Mật khẩu cũ không đúng."}, status=status.HTTP_400_BAD_REQUEST)
 
         # Cập nhật mật khẩu mới
-        user.password = make_password(new_password)
+        user.password = hashers.make_password(new_password)
         user.save()
 
         return Response({"detail": "Đổi mật khẩu thành công."}, status=status.HTTP_200_OK)
@@ -112,6 +105,31 @@ class ProviderViewSet(viewsets.ModelViewSet):
         serializer = ReviewSerializer(reviews, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=['get'], url_path='dashboard', url_name='dashboard')
+    def dashboard(self, request, pk=None):
+        provider = self.get_object()
+        try:
+            today = timezone.now().date()
+            start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') \
+                else today.replace(day=1)
+            end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') else today
+        except ValueError:
+            return Response({"detail": "start/end có dạng YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if start > end or (end - start).days > 366:
+            return Response({"detail": "Khoảng ngày không hợp lệ (tối đa 366 ngày)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        # Cache theo provider; signal của booking, review và lịch trình sẽ làm mới
+        response_cache = cache.get_response_cache()
+        key = cache.response_cache_key(request, 'dashboard', provider.pk)
+        data = response_cache.get(key)
+        if data is None:
+            data = provider.dashboard(start, end)
+            response_cache.set(key, data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+        return Response(data)
+
 
 class CustomerViewSet(viewsets.ModelViewSet):
     queryset = Customer.objects.all()
@@ -133,15 +151,17 @@ class CustomerViewSet(viewsets.ModelViewSet):
         return queryset
 
 
-class ServiceTypeViewSet(viewsets.ModelViewSet):
+class ServiceTypeViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = ServiceType.objects.all()
     serializer_class = serializers.ServiceTypeSerializer
+    cache_group = 'service-types'
     # permission_classes = [permissions.IsAuthenticated]
 
 
-class ProvinceViewSet(viewsets.ModelViewSet):
+class ProvinceViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Province.objects.all()
     serializer_class = serializers.ProvinceSerializer
+    cache_group = 'provinces'
     # permission_classes = [permissions.IsAuthenticated]
 
 
@@ -160,6 +180,16 @@ class ImageViewSet(viewsets.ModelViewSet):
 
         return queryset
 
+    def create(self, request, *args, **kwargs):
+        response = super().create(request, *args, **kwargs)
+        if self.upload_pending:
+            # Đã nhận file, ảnh sẽ có path khi worker upload xong
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def perform_create(self, serializer):
+        _, self.upload_pending = uploads.save_deferred(serializer, 'path')
+
 
 class Service01ViewSet(viewsets.ModelViewSet):
     queryset = Service.objects.all()
@@ -167,23 +197,26 @@ class Service01ViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class ServiceViewSet(viewsets.ModelViewSet):
+class ServiceViewSet(CachedResponseMixin, viewsets.ModelViewSet):
     queryset = Service.objects.all()
     serializer_class = serializers.ServiceSerializer
     pagination_class = paginators.ServicePaginator
+    cache_group = 'services'
+    cursor_ordering = ('id',)
     # permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        queryset = self.queryset
+        # Lấy discount cùng câu JOIN và gom ảnh của cả trang vào một truy vấn
+        queryset = self.queryset.select_related('discount').prefetch_related('image_set')
 
         if self.action == 'list':
             q = self.request.query_params.get('q')
             if q:
-                queryset = queryset.filter(name__icontains=q)
+                queryset = search.search(queryset, q)
 
             address = self.request.query_params.get('address')
             if address:
-                queryset = queryset.filter(address__icontains=address)
+                queryset = search.filter_all_terms(queryset, 'address', address)
 
             service_type = self.request.query_params.get('service_type')
             if service_type:
@@ -202,9 +235,34 @@ class ServiceViewSet(viewsets.ModelViewSet):
                 queryset = queryset.order_by('price')
             elif sort == '2':
                 queryset = queryset.order_by('-price')
+            elif q:
+                queryset = queryset.order_by('-search_rank', 'id')
 
         return queryset
 
+    @action(detail=True, methods=['get'], url_path='review-summary')
+    def review_summary(self, request, pk=None):
+        summaries = Service.review_summaries([pk]) if str(pk).isdigit() else []
+        if not summaries:
+            return Response({"detail": "Không tìm thấy dịch vụ"}, status=status.HTTP_404_NOT_FOUND)
+
+        return Response(summaries[0])
+
+    @action(detail=False, methods=['get'], url_path='review-summary')
+    def review_summaries(self, request):
+        # ?ids=1,2,3 lấy phân bố số sao của nhiều dịch vụ trong một truy vấn
+        try:
+            service_ids = sorted({int(pk) for pk in request.query_params.get('ids', '').split(',') if pk})
+        except ValueError:
+            return Response({"detail": "ids phải là danh sách id"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not service_ids:
+            return Response({"detail": "ids is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(service_ids) > 100:
+            return Response({"detail": "Tối đa 100 dịch vụ mỗi lần"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(Service.review_summaries(service_ids))
+
 
 class DiscountViewSet(viewsets.ModelViewSet):
     queryset = Discount.objects.all()
@@ -241,8 +299,90 @@ class ServiceScheduleViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-
-class CustomPageNumberPagination(PageNumberPagination):
+    @action(detail=False, methods=['get'], url_path='calendar', url_name='calendar')
+    def calendar(self, request):
+        try:
+            service_ids = sorted({int(pk) for pk in request.query_params.get('service', '').split(',') if pk})
+            today = timezone.now().date()
+            start = date.fromisoformat(request.query_params['start']) if request.query_params.get('start') \
+                else today.replace(day=1)
+            end = date.fromisoformat(request.query_params['end']) if request.query_params.get('end') \
+                else (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        except ValueError:
+            return Response({"detail": "service phải là danh sách id, start/end có dạng YYYY-MM-DD"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        if not service_ids:
+            return Response({"detail": "service is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end or (end - start).days > 366:
+            return Response({"detail": "Khoảng ngày không hợp lệ (tối đa 366 ngày)"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        months = []
+        month = start.replace(day=1)
+        while month <= end:
+            months.append(month)
+            month = (month + timedelta(days=32)).replace(day=1)
+
+        # Mỗi (service, tháng) được cache riêng, chỉ tính lại những phần chưa có trong một truy vấn
+        response_cache = cache.get_response_cache()
+        keys = {cache.calendar_cache_key(service_id, month): (service_id, month)
+                for service_id in service_ids for month in months}
+        cached = response_cache.get_many(keys)
+        missing = [keys[key] for key in keys if key not in cached]
+
+        if missing:
+            computed = {key: [] for key in keys if key not in cached}
+            first = min(month for _, month in missing)
+            last = (max(month for _, month in missing) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            for row in ServiceSchedule.calendar({service_id for service_id, _ in missing}, first, last):
+                key = cache.calendar_cache_key(row['service'], row['date'])
+                if key in computed:
+                    row['remaining'] = max(row['capacity'] - row['booked'], 0)
+                    computed[key].append(row)
+            response_cache.set_many(computed, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+            cached.update(computed)
+
+        data = [row for key in keys for row in cached[key] if start <= row['date'] <= end]
+        return Response(data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-generate', url_name='bulk-generate')
+    def bulk_generate(self, request):
+        serializer = serializers.ScheduleRecurrenceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        occurrences = serializer.get_occurrences(data)
+        if data['service'].provider_id != request.user.pk:
+            return Response({"detail": "Chỉ provider của service mới được tạo lịch trình."},
+                            status=status.HTTP_403_FORBIDDEN)
+
+        with transaction.atomic():
+            # Khoá service để hai lần gửi trùng nhau không cùng tạo một lịch trình
+            service = Service.objects.select_for_update().get(pk=data['service'].pk)
+            existing = set(ServiceSchedule.objects.filter(service=service,
+                                                          date__range=(data['start_date'], data['end_date']))
+                           .values_list('date', 'start_time'))
+
+            schedules = [ServiceSchedule(service=service, date=day, start_time=start_time, end_time=end_time,
+                                         max_participants=data['max_participants'],
+                                         available=data['max_participants'])
+                         for day, start_time, end_time in occurrences if (day, start_time) not in existing]
+            ServiceSchedule.objects.bulk_create(schedules, batch_size=500)
+
+        if schedules:
+            paginators.bump_count_version(ServiceSchedule)
+            cache.invalidate_calendar((service.pk, s.date) for s in schedules)
+            # bulk_create không phát signal nên phải tự làm mới dashboard của provider
+            cache.invalidate_dashboard([service.provider_id])
+
+        return Response({
+            'created': [{'date': s.date, 'start_time': s.start_time, 'end_time': s.end_time} for s in schedules],
+            'skipped': [{'date': day, 'start_time': start_time}
+                        for day, start_time, _ in occurrences if (day, start_time) in existing]
+        }, status=status.HTTP_201_CREATED if schedules else status.HTTP_200_OK)
+
+
+class CustomPageNumberPagination(paginators.KeysetOptInMixin, paginators.CachedCountPageNumberPagination):
     page_size = 5  # Số lượng đánh giá mỗi trang
     page_size_query_param = 'page_size'
     max_page_size = 10
@@ -264,106 +404,87 @@ class BookingViewSet(viewsets.ModelViewSet):
 
         return queryset
 
-    @action(detail=False, methods=['get'], url_path='customer-bookings', url_name='customer-bookings')
-    def customer_bookings(self, request):
+    def seats_unavailable_response(self):
+        return Response({"detail": "Lịch trình không còn đủ chỗ."}, status=status.HTTP_409_CONFLICT)
+
+    def create(self, request, *args, **kwargs):
+        try:
+            return super().create(request, *args, **kwargs)
+        except inventory.SeatsUnavailable:
+            return self.seats_unavailable_response()
+
+    def update(self, request, *args, **kwargs):
+        try:
+            return super().update(request, *args, **kwargs)
+        except inventory.SeatsUnavailable:
+            return self.seats_unavailable_response()
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response({"detail": "Booking đã có giao dịch thanh toán, không thể xoá."},
+                            status=status.HTTP_409_CONFLICT)
+
+    def perform_create(self, serializer):
+        data = serializer.validated_data
+        with transaction.atomic():
+            # Booking tạo ở trạng thái không active thì không giữ chỗ, giống perform_update
+            inventory.reserve_seats(*inventory.held_seats(data['service_schedule'].pk, data['quantity'],
+                                                          data.get('active', True)))
+            inventory.hold_booking(serializer.save())
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            # Khoá dòng booking để hai lần cập nhật đồng thời không trả/giữ chỗ hai lần
+            current = Booking.objects.select_for_update().get(pk=serializer.instance.pk)
+            old = inventory.held_seats(current.service_schedule_id, current.quantity, current.active)
+            booking = serializer.save()
+            inventory.move_seats(old, inventory.held_seats(booking.service_schedule_id, booking.quantity,
+                                                           booking.active))
+            if booking.active and not current.active:
+                inventory.hold_booking(booking)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            current = Booking.objects.select_for_update().filter(pk=instance.pk).first()
+            if current and current.active:
+                inventory.release_seats(current.service_schedule_id, current.quantity)
+            instance.delete()
+
+    def get_customer_bookings(self, request, serializer_class, ordering=None, **filters):
         customer_id = request.query_params.get('customer_id')
 
         if not customer_id:
             return Response({"detail": "customer_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        queryset = self.queryset.filter(customer=customer_id, payment_status=True, active=True)
+        queryset = self.queryset.filter(customer=customer_id, **filters) \
+            .select_related('service_schedule__service', 'seathold') \
+            .prefetch_related('service_schedule__service__image_set')
+        if ordering:
+            queryset = queryset.order_by(ordering)
 
         paginator = self.pagination_class()
-        paginated_bookings = paginator.paginate_queryset(queryset, request)
+        paginated_bookings = paginator.paginate_queryset(queryset, request, view=self)
+        serializer = serializer_class(paginated_bookings, many=True, context={'request': request})
 
-        data = []
+        return paginator.get_paginated_response(serializer.data)
 
-        for booking in paginated_bookings:
-            service_schedule = booking.service_schedule
-            service = service_schedule.service
-
-            images = [image.path.url for image in service.image_set.all()]
-            data.append({
-                'id': booking.id,
-                'service_id': service.id,
-                'service_name': service.name,
-                'service_address': service.address,
-                'service_images': images,
-                'date': service_schedule.date,
-                'start_time': service_schedule.start_time,
-                'end_time': service_schedule.end_time,
-                'quantity': booking.quantity
-            })
-
-        return paginator.get_paginated_response(data)
+    @action(detail=False, methods=['get'], url_path='customer-bookings', url_name='customer-bookings')
+    def customer_bookings(self, request):
+        return self.get_customer_bookings(request, serializers.BookingCardSerializer, payment_status=True,
+                                          active=True)
 
     @action(detail=False, methods=['get'], url_path='customer-bookings-notyetpaid',
             url_name='customer-bookings-notyetpaid')
     def customer_bookings_notyetpaid(self, request):
-        customer_id = request.query_params.get('customer_id')
-
-        if not customer_id:
-            return Response({"detail": "customer_id is required"}, status=status.HTTP_400_BAD_REQUEST)
-
-        queryset = self.queryset.filter(customer=customer_id, payment_status=False)
-
-        paginator = self.pagination_class()
-        paginated_bookings = paginator.paginate_queryset(queryset, request)
-
-        data = []
-
-        for booking in paginated_bookings:
-            service_schedule = booking.service_schedule
-            service = service_schedule.service
-
-            images = [image.path.url for image in service.image_set.all()]
-            data.append({
-                'id': booking.id,
-                'service_id': service.id,
-                'service_name': service.name,
-                'service_address': service.address,
-                'service_images': images,
-                'date': service_schedule.date,
-                'start_time': service_schedule.start_time,
-                'end_time': service_schedule.end_time,
-                'quantity': booking.quantity,
-                'total_price': booking.total_price
-            })
-
-        return paginator.get_paginated_response(data)
+        return self.get_customer_bookings(request, serializers.UnpaidBookingCardSerializer, payment_status=False,
+                                          active=True)
 
     @action(detail=False, methods=['get'], url_path='bookings-history', url_name='bookings-history')
     def bookings_history(self, request):
-        customer_id = request.query_params.get('customer_id')
-
-        if not customer_id:
-            return Response({"detail": "customer_id is required"}, status=status.HTTP_400_BAD_REQUEST)
-
-        queryset = self.queryset.filter(customer=customer_id, payment_status=True).order_by('-service_schedule__date')
-
-        paginator = self.pagination_class()
-        paginated_bookings = paginator.paginate_queryset(queryset, request)
-
-        data = []
-
-        for booking in paginated_bookings:
-            service_schedule = booking.service_schedule
-            service = service_schedule.service
-
-            images = [image.path.url for image in service.image_set.all()]
-            data.append({
-                'id': booking.id,
-                'service_id': service.id,
-                'service_name': service.name,
-                'service_address': service.address,
-                'service_images': images,
-                'date': service_schedule.date,
-                'start_time': service_schedule.start_time,
-                'end_time': service_schedule.end_time,
-                'quantity': booking.quantity
-            })
-
-        return paginator.get_paginated_response(data)
+        return self.get_customer_bookings(request, serializers.BookingCardSerializer,
+                                          ordering='-service_schedule__date', payment_status=True)
 
 
 class ReviewViewSet(viewsets.ModelViewSet):
@@ -379,140 +500,117 @@ class ReviewViewSet(viewsets.ModelViewSet):
         if not service_id:
             return Response({"detail": "service_id is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Lọc danh sách đánh giá dựa trên service_id
-        reviews = self.queryset.filter(service_id=service_id).order_by('-created_date')
+        # Trang đầu là trang màn hình chi tiết service luôn tải, nên được cache theo service
+        first_page = request.query_params.get('page', '1') == '1' and 'cursor' not in request.query_params
+        response_cache = cache.get_response_cache()
+        key = cache.response_cache_key(request, 'reviews', service_id)
+        if first_page:
+            data = response_cache.get(key)
+            if data is not None:
+                return Response(data)
+
+        # ?excerpt=true chỉ trả về đoạn đầu của nội dung
+        excerpt_length = settings.REVIEW_EXCERPT_LENGTH if request.query_params.get('excerpt') in ('1', 'true') \
+            else None
+        reviews = Review.feed(service_id, excerpt_length)
 
         # Phân trang
         paginator = self.pagination_class()
-        paginated_reviews = paginator.paginate_queryset(reviews, request)
+        paginated_reviews = paginator.paginate_queryset(reviews, request, view=self)
 
+        variant = images.get_variant(request)
         data = []
         for review in paginated_reviews:
-            data.append({
-                'review_id': review.id,
-                'customer_avatar': review.customer.user.avatar.url if review.customer.user.avatar else None,
-                'customer_name': review.customer.full_name,
-                'rating': review.star,
-                'content': review.content,
-                'created_date': review.created_date,
-                'updated_date': review.updated_date,
-            })
+            item = {
+                'review_id': review['id'],
+                'customer_avatar': images.variant_url(review['customer_avatar_urls'], review['customer_avatar'],
+                                                      variant),
+                'customer_name': review['customer_name'],
+                'rating': review['star'],
+                'content': review['content_text'],
+                'created_date': review['created_date'],
+                'updated_date': review['updated_date'],
+            }
+            if excerpt_length:
+                prefix = item['content'] or ''
+                cut = (review['content_length'] or 0) > len(prefix)
+                if cut and prefix.rfind('<') > prefix.rfind('>'):
+                    # Bỏ thẻ HTML bị cắt dở ở cuối đoạn lấy từ SQL
+                    prefix = prefix[:prefix.rfind('<')]
+                text = strip_tags(prefix)
+                if cut and len(text) < excerpt_length:
+                    # Nội dung quá nhiều thẻ, đoạn lấy dư vẫn chưa đủ chữ: đọc cả nội dung
+                    text = strip_tags(Review.objects.values_list('content', flat=True).get(pk=review['id']))
+                    cut = False
+                item['content'] = Truncator(text).chars(excerpt_length)
+                item['truncated'] = cut or len(text) > excerpt_length
+            data.append(item)
 
         # Trả về dữ liệu phân trang với cấu trúc giống như trước
-        return paginator.get_paginated_response(data)
+        response = paginator.get_paginated_response(data)
+        if first_page:
+            response_cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+
+        return response
 
 
 @csrf_exempt
-def payment_view(request: HttpRequest):
-    accessKey = 'F8BBA842ECF85'
-    secretKey = 'K951B6PE1waDMi640xX08PD3vg6EkVlz'
-    orderInfo = 'pay with MoMo'
-    partnerCode = 'MOMO'
-    redirectUrl = 'https://webhook.site/b3088a6a-2d17-4f8d-a383-71389a6c600b'
-    ipnUrl = 'https://webhook.site/b3088a6a-2d17-4f8d-a383-71389a6c600b'
-    requestType = "payWithMethod"
-    amount = request.headers.get('amount', '')  # Lấy amount từ header
-    orderId = partnerCode + str(int(time.time() * 1000))
-    requestId = orderId
-    extraData = ''
-    orderGroupId = ''
-    autoCapture = True
-    autoCapture = True
-    lang = 'vi'
-
-    # Tạo chuỗi signature
-    rawSignature = f"accessKey={accessKey}&amount={amount}&extraData={extraData}&ipnUrl={ipnUrl}&orderId={orderId}&orderInfo={orderInfo}&partnerCode={partnerCode}&redirectUrl={redirectUrl}&requestId={requestId}&requestType={requestType}"
-    signature = hmac.new(secretKey.encode(), rawSignature.encode(), hashlib.sha256).hexdigest()
-
-    # Tạo request body
-    data = {
-        "partnerCode": partnerCode,
-        "partnerName": "Test",
-        "storeId": "MomoTestStore",
-        "requestId": requestId,
-        "amount": amount,
-        "orderId": orderId,
-        "orderInfo": orderInfo,
-        "redirectUrl": redirectUrl,
-        "ipnUrl": ipnUrl,
-        "lang": lang,
-        "requestType": requestType,
-        "autoCapture": autoCapture,
-        "extraData": extraData,
-        "orderGroupId": orderGroupId,
-        "signature": signature
-    }
+async def payment_view(request: HttpRequest):
+    return await payments.create_payment(request, 'momo')
 
-    # Gửi request đến MoMo
-    response = requests.post('https://test-payment.momo.vn/v2/gateway/api/create', json=data)
-    response_data = response.json()
-    pay_url = response_data.get('payUrl')
 
-    return JsonResponse(response_data)
+@csrf_exempt
+async def create_payment(request):
+    if request.method == 'POST':
+        return await payments.create_payment(request, 'zalopay')
+    else:
+        return JsonResponse({"error": "Only POST requests are allowed"})
 
 
-config = {
-    "app_id": 2553,
-    "key1": "PcY4iZIKFCIdgZvA6ueMcMHHUbRLYjPL",
-    "key2": "kLtgPl8HHhfvMuDHPwKfgfsY4Ydm9eIz",
-    "endpoint": "https://sb-openapi.zalopay.vn/v2/create"
-}
+@csrf_exempt
+def momo_ipn(request):
+    return payments.handle_callback(request, 'momo')
 
 
 @csrf_exempt
-def create_payment(request):
-    if request.method == 'POST':
-        # Lấy thông tin từ yêu cầu của người dùng
-        amount = request.headers.get('amount', '')  # Lấy amount từ header
-        transID = random.randrange(1000000)
-        # Xây dựng yêu cầu thanh toán
-        order = {
-            "app_id": config["app_id"],
-            "app_trans_id": "{:%y%m%d}_{}".format(datetime.today(), transID),  # mã giao dich có định dạng yyMMdd_xxxx
-            "app_user": "user123",
-            "app_time": int(round(time.time() * 1000)),  # miliseconds
-            "embed_data": json.dumps({}),
-            "item": json.dumps([{}]),
-            "amount": amount,
-            "description": "Thanh Toán Vé Xe #" + str(transID),
-            "bank_code": "",
-        }
-
-        # Tạo chuỗi dữ liệu và mã hóa HMAC
-        data = "{}|{}|{}|{}|{}|{}|{}".format(order["app_id"], order["app_trans_id"], order["app_user"],
-                                             order["amount"], order["app_time"], order["embed_data"], order["item"])
-        order["mac"] = hmac.new(config['key1'].encode(), data.encode(), hashlib.sha256).hexdigest()
-
-        # Gửi yêu cầu đến ZaloPay API
-        try:
-            response = urllib.request.urlopen(url=config["endpoint"], data=urllib.parse.urlencode(order).encode())
-            result = json.loads(response.read())
-            return JsonResponse(result)
-        except Exception as e:
-            return JsonResponse({"error": str(e)})
-    else:
-        return JsonResponse({"error": "Only POST requests are allowed"})
+def zalopay_callback(request):
+    return payments.handle_callback(request, 'zalopay')
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def http_stats(request):
+    # Số request / kết nối mới / kết nối tái sử dụng theo host của process hiện tại
+    return Response(http.get_stats())
 
 
 def get_customers_by_schedule(request, schedule_id):
-    # Lấy danh sách các đặt chỗ liên quan đến lịch trình cụ thể
-    bookings = Booking.objects.filter(service_schedule_id=schedule_id).select_related('customer')
+    # ?format=csv hoặc ?stream=true trả về dạng stream cho các tour đông khách;
+    # qua ASGI phải dùng iterator bất đồng bộ thì Django mới stream thay vì gom cả danh sách
+    variant = images.get_variant(request)
+    streaming = isinstance(request, ASGIRequest)
 
-    # Trích xuất thông tin của khách hàng từ các đặt chỗ
-    customers = []
-    for booking in bookings:
-        customer = booking.customer
-        customers.append({
-            'full_name': customer.full_name,
-            'phone': customer.user.phone,
-            'address': customer.user.address,
-            'avatar': customer.user.avatar.url if customer.user.avatar else None
-        })
+    if request.GET.get('format') == 'csv':
+        content = rosters.astream_csv(rosters.aroster_rows(schedule_id, variant)) if streaming \
+            else rosters.stream_csv(rosters.roster_rows(schedule_id, variant))
+        response = StreamingHttpResponse(content, content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="schedule-{schedule_id}-customers.csv"'
+        return response
 
-    return JsonResponse(customers, safe=False)
+    if request.GET.get('stream') in ('1', 'true'):
+        content = rosters.astream_json(rosters.aroster_rows(schedule_id, variant)) if streaming \
+            else rosters.stream_json(rosters.roster_rows(schedule_id, variant))
+        return StreamingHttpResponse(content, content_type='application/json')
+
+    return JsonResponse(list(rosters.roster_rows(schedule_id, variant)), safe=False)
 
 
 class RevenueViewSet(viewsets.ViewSet):
+    REVENUE_BREAKDOWNS = {
+        'provider': ('provider', 'provider__name'),
+        'service_type': ('service__service_type', 'service__service_type__name'),
+        'province': ('service__province', 'service__province__name'),
+    }
 
     @action(detail=True, methods=['get'], url_path='monthly-revenue')
     def monthly_revenue(self, request, pk=None):
@@ -528,6 +626,10 @@ class RevenueViewSet(viewsets.ViewSet):
         except ValueError:
             return Response({"error": "Invalid month or year"}, status=400)
 
+        # revenue_by_month dựng date(year, month, 1) nên phải chặn tháng/năm ngoài khoảng trước
+        if not 1 <= month <= 12 or not 1 <= year < 9999:
+            return Response({"error": "Invalid month or year"}, status=400)
+
         provider = get_object_or_404(Provider, pk=pk)
         revenue_data = provider.revenue_by_month(month, year)
         serializer = ServiceRevenueSerializer(revenue_data, many=True)
@@ -545,17 +647,29 @@ class RevenueViewSet(viewsets.ViewSet):
         except ValueError:
             return Response({"error": "Invalid year"}, status=400)
 
-        providers = Provider.objects.all()
-        monthly_revenue = []
-
-        for month in range(1, 13):
-            total_revenue = 0
-            for provider in providers:
-                revenue_data = provider.revenue_by_month(month, year)
-                total_revenue += sum(item['total_revenue'] for item in revenue_data)
-            monthly_revenue.append({
-                'month': month,
-                'total_revenue': total_revenue
-            })
+        breakdowns = [b for b in request.query_params.get('breakdown', '').split(',') if b]
+        invalid = [b for b in breakdowns if b not in self.REVENUE_BREAKDOWNS]
+        if invalid:
+            return Response({"error": f"Invalid breakdown: {', '.join(invalid)}"}, status=400)
+
+        # Chỉ một câu GROUP BY theo tháng trên bảng tổng hợp RevenueDaily
+        revenue = RevenueDaily.objects.filter(date__year=year).annotate(month=TruncMonth('date'))
+        totals = {row['month'].month: row['total_revenue']
+                  for row in revenue.values('month').annotate(total_revenue=Sum('revenue'))}
+
+        monthly_revenue = [{'month': month, 'total_revenue': totals.get(month, 0)} for month in range(1, 13)]
+
+        for breakdown in breakdowns:
+            id_field, name_field = self.REVENUE_BREAKDOWNS[breakdown]
+            rows = revenue.values('month', id_field, name_field).annotate(total_revenue=Sum('revenue')) \
+                .order_by('month', '-total_revenue')
+            for item in monthly_revenue:
+                item[breakdown] = []
+            for row in rows:
+                monthly_revenue[row['month'].month - 1][breakdown].append({
+                    'id': row[id_field],
+                    'name': row[name_field],
+                    'total_revenue': row['total_revenue']
+                })
 
         return Response(monthly_revenue, status=200)
@@ -48,10 +48,84 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
+        'travel.authentication.CachedOAuth2Authentication',
     )
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+# Cache AccessToken đã xác thực (giây); với nhiều process nên trỏ alias sang cache dùng chung (Redis, Memcached)
+# để thu hồi token có hiệu lực ở mọi process, locmem chỉ xoá được entry của process hiện tại
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 60
+
+# Cache COUNT(*) của các trang danh sách (giây) và ngưỡng dùng số dòng ước lượng cho bảng lớn không lọc
+# (None để luôn COUNT chính xác); số dòng ước lượng được nhớ theo bảng trong PAGINATION_COUNT_ESTIMATE_TIMEOUT giây
+PAGINATION_COUNT_CACHE_TIMEOUT = 60
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = 100000
+PAGINATION_COUNT_ESTIMATE_TIMEOUT = 3600
+
+# Cache response của các API công khai (service, loại dịch vụ, tỉnh); đổi alias để dùng backend khác
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+# Độ dài đoạn trích nội dung review khi gọi service-reviews?excerpt=true
+REVIEW_EXCERPT_LENGTH = 200
+
+# Số phút giữ chỗ cho booking chưa thanh toán, sau đó release_expired_holds sẽ trả chỗ
+SEAT_HOLD_MINUTES = 15
+
+# Cổng thanh toán: gọi bất đồng bộ qua travel.http với pool kết nối, timeout và thử lại
+PAYMENT_PROVIDERS = {
+    'momo': {
+        'endpoint': 'https://test-payment.momo.vn/v2/gateway/api/create',
+        'partner_code': 'MOMO',
+        'access_key': 'F8BBA842ECF85',
+        'secret_key': 'K951B6PE1waDMi640xX08PD3vg6EkVlz',
+        'redirect_url': 'https://webhook.site/b3088a6a-2d17-4f8d-a383-71389a6c600b',
+        'ipn_url': 'https://webhook.site/b3088a6a-2d17-4f8d-a383-71389a6c600b',  # trỏ tới /payment/momo/ipn/
+    },
+    'zalopay': {
+        'endpoint': 'https://sb-openapi.zalopay.vn/v2/create',
+        'app_id': 2553,
+        'key1': 'PcY4iZIKFCIdgZvA6ueMcMHHUbRLYjPL',
+        'key2': 'kLtgPl8HHhfvMuDHPwKfgfsY4Ydm9eIz',
+        'callback_url': '',  # trỏ tới /zalo/callback/
+    },
+}
+PAYMENT_HTTP_RETRIES = 2
+PAYMENT_HTTP_RETRY_BACKOFF = 0.2
+PAYMENT_HTTP_MAX_CONNECTIONS = 20
+PAYMENT_HTTP_MAX_KEEPALIVE = 10
+
+# Pool kết nối HTTP dùng chung (cổng thanh toán, Cloudinary): timeout đọc theo từng host, mặc định HTTP_DEFAULT_TIMEOUT
+HTTP_DEFAULT_TIMEOUT = 10
+HTTP_CONNECT_TIMEOUT = 3
+HTTP_HOST_TIMEOUTS = {
+    'test-payment.momo.vn': 10,
+    'sb-openapi.zalopay.vn': 10,
+    'api.cloudinary.com': 60,
+}
+HTTP_NUM_POOLS = 10
+HTTP_POOL_MAXSIZE = 10
+
+# Các biến thể ảnh được dựng sẵn URL khi lưu; client chọn bằng ?variant=
+IMAGE_VARIANTS = {
+    'thumb': {'width': 150, 'height': 150, 'crop': 'fill', 'quality': 'auto', 'fetch_format': 'auto'},
+    'card': {'width': 600, 'height': 400, 'crop': 'fill', 'quality': 'auto', 'fetch_format': 'auto'},
+    'full': {},
+}
+
+# Upload ảnh ở nền: file được lưu tạm vào UPLOAD_STAGING_DIR rồi worker đẩy lên storage
+UPLOAD_STORAGE_BACKEND = 'travel.uploads.CloudinaryStorage'  # 'travel.uploads.LocalFakeStorage' khi kiểm thử
+UPLOAD_STAGING_DIR = BASE_DIR / 'upload_staging'
+UPLOAD_WORKERS = 4
+UPLOAD_MAX_ATTEMPTS = 3
+
 CKEDITOR_UPLOAD_PATH = "ckeditor/images"
 
 AUTH_USER_MODEL = 'travel.User'
@@ -133,6 +207,27 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Băm mật khẩu: chọn 'pbkdf2', 'scrypt' hoặc 'argon2' (cần argon2-cffi) và chi phí của từng loại;
+# hash cũ vẫn dùng được và sẽ được băm lại theo cấu hình mới khi người dùng đăng nhập
+PASSWORD_HASHER = 'pbkdf2'
+PASSWORD_PBKDF2_ITERATIONS = 720000
+PASSWORD_SCRYPT_WORK_FACTOR = 2 ** 14
+PASSWORD_ARGON2_TIME_COST = 2
+PASSWORD_ARGON2_MEMORY_COST = 102400
+PASSWORD_ARGON2_PARALLELISM = 8
+PASSWORD_HASHING_WORKERS = 4
+
+_PASSWORD_HASHERS = {
+    'pbkdf2': 'travel.hashers.TunedPBKDF2PasswordHasher',
+    'scrypt': 'travel.hashers.TunedScryptPasswordHasher',
+    'argon2': 'travel.hashers.TunedArgon2PasswordHasher',
+}
+PASSWORD_HASHERS = [_PASSWORD_HASHERS[PASSWORD_HASHER]] + \
+    [hasher for name, hasher in _PASSWORD_HASHERS.items() if name != PASSWORD_HASHER] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.1/topics/i18n/
 